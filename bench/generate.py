@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import string
+import sys
+import numpy as np
+
+# Deterministic synthetic corpora for the benchmarks. Words are drawn from a
+# Zipf distribution (the n-th most frequent word has probability ~ 1 / n^s),
+# like the words of natural language, so postings lengths, vocabulary growth
+# and query costs behave like on the real tweets and reviews.
+# The same arguments always give the same file.
+
+start_time = 1471680000  # 2016-08-20 08:00:00 UTC
+
+
+def word(rank):
+    """
+    alphabetic word for a rank: a, b, ..., z, ba, bb, ...
+    """
+    letters = []
+    while True:
+        rank, letter = divmod(rank, 26)
+        letters.append(string.ascii_lowercase[letter])
+        if rank == 0:
+            return "".join(reversed(letters))
+
+
+def zipf_sampler(size, exponent, rng):
+    """
+    function drawing n ranks in range(size) with probability ~ 1 / rank^s
+    """
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    cumulative = np.cumsum(weights / weights.sum())
+
+    def sample(n):
+        return np.minimum(np.searchsorted(cumulative, rng.random_sample(n)),
+                          size - 1)
+    return sample
+
+
+def tweets(filename, documents=10000, vocabulary=50000, exponent=1.1,
+           users=1000, seed=0):
+    """
+    tweet file: timestamp, tweet id, @user, name, text (tab separated)
+    """
+    rng = np.random.RandomState(seed)
+    words = [word(rank) for rank in range(vocabulary)]
+    sample = zipf_sampler(vocabulary, exponent, rng)
+    sample_user = zipf_sampler(users, 1.0, rng)
+    lengths = rng.randint(3, 25, size=documents)
+    tokens = sample(int(lengths.sum()))
+    authors = sample_user(documents)
+    with open(filename, "w") as file:
+        position = 0
+        for d in range(documents):
+            text = " ".join(words[t] for t in
+                            tokens[position:position + lengths[d]])
+            position += lengths[d]
+            timestamp = np.datetime64(start_time + 30 * d, "s")
+            file.write("%s +0000\t%d\t@user%d\tUser %d\t%s\n" % (
+                str(timestamp).replace("T", " "), 765000000000000000 + d,
+                authors[d], authors[d], text))
+    return words
+
+
+def reviews(filename, documents=2000, vocabulary=20000, exponent=1.1,
+            seed=0):
+    """
+    games review file: game, gut or schlecht, title, text (tab separated)
+    every class uses a tenth of its words from its own vocabulary, so
+    the classes can be learned
+    """
+    rng = np.random.RandomState(seed)
+    words = [word(rank) for rank in range(vocabulary)]
+    sample = zipf_sampler(vocabulary, exponent, rng)
+    classes = ["gut", "schlecht"]
+    labels = rng.randint(0, 2, size=documents)
+    with open(filename, "w") as file:
+        for d in range(documents):
+            fields = []
+            for length in (rng.randint(2, 8), rng.randint(20, 200)):
+                ranks = sample(length)
+                # class words: the ranks of the class, offset into the
+                # rare part of the vocabulary
+                own = rng.random_sample(length) < 0.1
+                ranks[own] = (ranks[own] * 2 + labels[d] +
+                              vocabulary // 2) % vocabulary
+                fields.append(" ".join(words[r] for r in ranks))
+            file.write("game%d\t%s\t%s\t%s\n" % (
+                d % 500, classes[labels[d]], fields[0], fields[1]))
+
+
+def points(documents=100000, k=20, seed=0):
+    """
+    (documents, 2) array of points around k centers, like the V1, V2 features
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(-10, 10, size=(k, 2))
+    labels = rng.randint(0, k, size=documents)
+    return centers[labels] + rng.normal(size=(documents, 2))
+
+
+if __name__ == "__main__":
+    # generate.py tweets|reviews output [documents] [seed]
+    kind, output = sys.argv[1:3]
+    arguments = dict(zip(["documents", "seed"],
+                         [int(argument) for argument in sys.argv[3:5]]))
+    {"tweets": tweets, "reviews": reviews}[kind](output, **arguments)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for directory in ("common", "uebung1", "uebung3", "uebung4", "uebung5"):
+    sys.path.append(os.path.join(root, directory))
+import generate  # noqa: E402
+
+# Benchmarks on synthetic corpora (see generate.py): indexing throughput and
+# memory, boolean and ranked query latency, Naive Bayes training and
+# classification throughput and k-means time per iteration.
+# Every benchmark runs in a fresh process, so it has its own memory peak and
+# the module level indexes start empty. The results are saved as JSON, a
+# run can be compared with the results of an earlier version.
+#
+# run.py [--size small|medium|large] [--label name] [--compare old.json]
+
+sizes = {
+    "small": {"tweets": 20000, "reviews": 2000, "points": 100000,
+              "queries": 100},
+    "medium": {"tweets": 200000, "reviews": 20000, "points": 1000000,
+               "queries": 200},
+    "large": {"tweets": 2000000, "reviews": 200000, "points": 10000000,
+              "queries": 500},
+}
+
+
+def peak_memory():
+    """
+    peak resident memory of this process in MB
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def latencies(seconds):
+    seconds = np.asarray(seconds, dtype=np.float64)
+    if len(seconds) == 0:
+        return {"queries": 0}
+    return {
+        "queries": len(seconds),
+        "mean": float(seconds.mean()),
+        "p50": float(np.percentile(seconds, 50)),
+        "p90": float(np.percentile(seconds, 90)),
+        "p99": float(np.percentile(seconds, 99)),
+        "queries_per_second": float(len(seconds) / max(seconds.sum(), 1e-12)),
+    }
+
+
+def queries(amount, vocabulary, seed=1):
+    """
+    deterministic queries of one to three Zipf distributed words
+    """
+    rng = np.random.RandomState(seed)
+    sample = generate.zipf_sampler(vocabulary, 1.1, rng)
+    return [[generate.word(rank) for rank in sample(rng.randint(1, 4))]
+            for _ in range(amount)]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def boolean(filename, searches, cache):
+    """
+    uebung1: index (cold and warm corpus cache) and AND queries of two terms
+    """
+    os.environ["IRTM_CACHE"] = cache
+    import metrics
+    import tweets
+    size = os.path.getsize(filename)
+    with redirect_stdout(io.StringIO()):
+        _, cold = timed(tweets.index, filename)
+        documents = metrics.counters["index.documents"]
+        _, warm = timed(tweets.index, filename)
+        metrics.reset()
+        for search in searches:
+            tweets.query(search[0], search[1] if len(search) > 1 else "")
+    timer = metrics.snapshot()["timers"].get("query.boolean", {})
+    histogram = metrics.snapshot()["histograms"].get("query.boolean", {})
+    return {
+        "index_seconds": cold,
+        "index_warm_seconds": warm,
+        "documents_per_second": documents / cold,
+        "megabytes_per_second": size / 1e6 / cold,
+        "query": {"queries": timer.get("calls", 0),
+                  "mean": timer.get("mean", 0.0),
+                  "p50": histogram.get("p50", 0.0),
+                  "p90": histogram.get("p90", 0.0),
+                  "p99": histogram.get("p99", 0.0)},
+        "peak_memory_mb": peak_memory(),
+    }
+
+
+def ranked(filename, searches, cache):
+    """
+    uebung3: index, fitting the scorers and top 100 queries, exhaustive and
+    with impact ordered postings
+    """
+    os.environ["IRTM_CACHE"] = cache
+    import impact
+    import scoring
+    import tf_idf
+    with redirect_stdout(io.StringIO()):
+        _, seconds = timed(tf_idf.index, filename)
+    result = {
+        "index_seconds": seconds,
+        "documents_per_second": len(tf_idf.postings.lengths) / seconds,
+        "terms": len(tf_idf.lexicon),
+        "postings": len(tf_idf.postings.docs),
+    }
+    counts = [tf_idf.query_counts(search, tf_idf.lexicon,
+                                  tf_idf.term_dictionary)
+              for search in searches]
+    counts = [dict(c) for c in counts if c]
+    for name in ("tfidf", "bm25"):
+        scorer, fit = timed(scoring.scorers[name]().fit, tf_idf.postings)
+        seconds = []
+        for query in counts:
+            start = time.perf_counter()
+            scoring.top(scorer.score(query), 100)
+            seconds.append(time.perf_counter() - start)
+        result[name] = {"fit_seconds": fit, "query": latencies(seconds)}
+        if name == "bm25":
+            index, build = timed(impact.ImpactIndex, scorer)
+            result["impact"] = {"build_seconds": build}
+            for budget, recall, mean in impact.evaluate(
+                    index, counts, 100, (None, 10000, 1000)):
+                result["impact"]["budget_" + str(budget)] = {
+                    "recall": recall, "mean": mean}
+    result["peak_memory_mb"] = peak_memory()
+    return result
+
+
+def naive_bayes(train_file, test_file, cache):
+    """
+    uebung4: loading, training and classifying reviews
+    """
+    os.environ["IRTM_CACHE"] = cache
+    import nb
+    train, load = timed(nb.load_csv, train_file)
+    test = nb.load_csv(test_file)
+    _, learn = timed(nb.learn, train)
+    results, classify = timed(nb.test_data, test)
+    return {
+        "load_seconds": load,
+        "train_documents_per_second": len(train) / learn,
+        "classify_documents_per_second": len(test) / classify,
+        "accuracy": (results[0] + results[1]) / float(results[4]),
+        "peak_memory_mb": peak_memory(),
+    }
+
+
+def k_means(documents, k=20):
+    """
+    uebung5: time per iteration of Lloyd, Hamerly and Elkan from the same
+    k-means++ start, and mini-batch k-means
+    """
+    import k_means as km
+    X = generate.points(documents, k).astype(np.float32)
+    C = km.k_means_plus_plus(X, k, np.random.RandomState(0))
+    result = {}
+    for name in ("lloyd", "hamerly", "elkan"):
+        (clusters, _, inertia, history, skipped), seconds = timed(
+            km.algorithms[name], X, C)
+        result[name] = {"seconds": seconds, "iterations": len(history),
+                        "seconds_per_iteration": seconds / len(history),
+                        "inertia": float(inertia)}
+    _, seconds = timed(km.mini_batch_k_means, X, k, 1024)
+    result["mini_batch"] = {"seconds": seconds}
+    result["peak_memory_mb"] = peak_memory()
+    return result
+
+
+def isolated(benchmark, *args):
+    """
+    result of a benchmark run in a fresh process
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(benchmark, args)
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=root,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit, "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def flatten(results, prefix=""):
+    """
+    path -> value of all numbers in nested dicts
+    """
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(old, new):
+    """
+    print every number of two result files with its relative change
+    """
+    old = flatten(old["benchmarks"])
+    new = flatten(new["benchmarks"])
+    for path in sorted(set(old) & set(new)):
+        change = (new[path] - old[path]) / old[path] * 100 if old[path] \
+            else 0.0
+        print("%-50s %14.6g %14.6g %+8.1f %%" % (path, old[path], new[path],
+                                                 change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", choices=sorted(sizes), default="small")
+    parser.add_argument("--label", default=None,
+                        help="name of the result file, default: the commit")
+    parser.add_argument("--compare", default=None,
+                        help="result file of an earlier run")
+    parser.add_argument("--output", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results"))
+    args = parser.parse_args()
+    size = sizes[args.size]
+    # the corpora and the corpus cache are removed after the run
+    with tempfile.TemporaryDirectory(prefix="irtm-bench-") as work:
+        tweet_file = os.path.join(work, "tweets")
+        train_file = os.path.join(work, "games-train.csv")
+        test_file = os.path.join(work, "games-test.csv")
+        words = generate.tweets(tweet_file, size["tweets"])
+        generate.reviews(train_file, size["reviews"], seed=0)
+        generate.reviews(test_file, size["reviews"] // 4, seed=1)
+        searches = queries(size["queries"], len(words))
+        cache = os.path.join(work, "cache")
+        benchmarks = {}
+        for name, benchmark, arguments in [
+                ("boolean", boolean, (tweet_file, searches, cache)),
+                ("ranked", ranked, (tweet_file, searches, cache)),
+                ("naive_bayes", naive_bayes, (train_file, test_file, cache)),
+                ("k_means", k_means, (size["points"],))]:
+            print("running " + name)
+            benchmarks[name] = isolated(benchmark, *arguments)
+    results = {"size": args.size, "sizes": size,
+               "environment": environment(), "benchmarks": benchmarks}
+    label = args.label or (results["environment"]["commit"] or "run")[:12]
+    os.makedirs(args.output, exist_ok=True)
+    output = os.path.join(args.output, label + "-" + args.size + ".json")
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    print(json.dumps(benchmarks, indent=2, sort_keys=True))
+    print("saved " + output)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main()
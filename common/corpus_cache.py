@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+from array import array
+from collections import namedtuple
+import hashlib
+import os
+import pickle
+
+import metrics
+
+# Tokenized corpora, cached on disk.
+# A cache entry is keyed by the sha256 of the corpus file and the tokenizer
+# config, so a changed file or a changed tokenizer never hits a stale entry.
+# Terms are stored once in a table and every document as term ids, which
+# keeps the entries small and fast to load.
+
+cache_dir = os.environ.get(
+    "IRTM_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               os.pardir, ".cache", "corpus"))
+# the least recently used entries are removed above this size
+max_bytes = int(os.environ.get("IRTM_CACHE_SIZE", 1 << 30))
+
+# terms: list of all terms, a term id is the index in this list
+# ids: term ids of all fields of all documents, one after another
+# offsets: fields of document d are ids[offsets[d * fields + f]:...+1]]
+# labels: per document tuple of untokenized columns (e.g. class of a review)
+# fields: number of token fields per document
+Corpus = namedtuple("Corpus", ["terms", "ids", "offsets", "labels", "fields"])
+
+
+def file_hash(filename, block_size=1 << 20):
+    """
+    sha256 of the content of a file, read block by block
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(filename, config):
+    digest = hashlib.sha256(file_hash(filename).encode())
+    digest.update(repr(config).encode())
+    return digest.hexdigest()
+
+
+def encode(lines, tokenizer):
+    """
+    tokenize all lines (or other records, e.g. parsed csv rows) into a Corpus
+    tokenizer(line) returns (labels, [tokens of field 1, tokens of field 2..])
+    or None to skip the line
+    """
+    terms = []
+    term_ids = {}
+    ids = array("i")
+    offsets = array("q", [0])
+    labels = []
+    fields = None
+    for line in lines:
+        document = tokenizer(line)
+        if document is None:
+            continue
+        document_labels, document_fields = document
+        if fields is None:
+            fields = len(document_fields)
+        labels.append(tuple(document_labels))
+        for tokens in document_fields:
+            for token in tokens:
+                term_id = term_ids.get(token)
+                if term_id is None:
+                    term_id = term_ids[token] = len(terms)
+                    terms.append(token)
+                ids.append(term_id)
+            offsets.append(len(ids))
+    return Corpus(terms, ids, offsets, labels, fields or 0)
+
+
+def evict(keep=None):
+    """
+    remove the least recently used entries until the cache fits into
+    max_bytes, the entry keep is never removed
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(".pickle") and os.path.isfile(path):
+            info = os.stat(path)
+            entries.append((info.st_mtime, info.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= size
+
+
+def load(filename, tokenizer, config, reader=None):
+    """
+    the tokenized Corpus of a file, from the cache if possible
+    config has to describe everything the tokenizer does (name, version,
+    stop words...), it is part of the cache key
+    reader(file) turns the open file into the records for the tokenizer
+    (default: its lines), e.g. a csv reader for fields over several lines
+    """
+    path = os.path.join(cache_dir, cache_key(filename, config) + ".pickle")
+    if os.path.exists(path):
+        with metrics.timer("corpus.load"):
+            with open(path, "rb") as file:
+                corpus = pickle.load(file)
+        # mark as recently used for the eviction
+        os.utime(path)
+        metrics.cache("corpus", True)
+        return corpus
+    metrics.cache("corpus", False)
+    # tokenizing includes normalizing the terms
+    with metrics.timer("corpus.tokenize"):
+        with open(filename, "r") as file:
+            corpus = encode(file if reader is None else reader(file),
+                            tokenizer)
+    metrics.count("corpus.bytes", os.path.getsize(filename))
+    metrics.count("corpus.documents", len(corpus.labels))
+    metrics.count("corpus.tokens", len(corpus.ids))
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary name first, so parallel runs never read half files
+    temporary = path + "." + str(os.getpid())
+    with open(temporary, "wb") as file:
+        pickle.dump(corpus, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    evict(keep=path)
+    return corpus
+
+
+def documents(corpus):
+    """
+    iterate over (labels, [tokens of every field]) of all documents
+    """
+    terms = corpus.terms
+    ids = corpus.ids
+    offsets = corpus.offsets
+    fields = corpus.fields
+    for d, labels in enumerate(corpus.labels):
+        start = d * fields
+        yield labels, [[terms[i] for i in ids[offsets[f]:offsets[f + 1]]]
+                       for f in range(start, start + fields)]
+
+
+def document_ids(corpus):
+    """
+    iterate over (labels, [term ids of every field]) of all documents, the
+    ids index corpus.terms (e.g. a lexicon.Lexicon(corpus.terms))
+    """
+    ids = corpus.ids
+    offsets = corpus.offsets
+    fields = corpus.fields
+    for d, labels in enumerate(corpus.labels):
+        start = d * fields
+        yield labels, [ids[offsets[f]:offsets[f + 1]]
+                       for f in range(start, start + fields)]
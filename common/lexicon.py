@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+from bisect import bisect_right
+import fnmatch
+import re
+import numpy as np
+
+import metrics
+
+# Maps terms to dense integer ids (0, 1, 2, ... in order of first appearance),
+# so postings, idf values and counts can live in arrays indexed by term id
+# instead of dicts keyed by strings.
+#
+# On disk the terms are stored sorted and front coded: every term only stores
+# the length of the prefix it shares with the term before and the rest.
+# Every block_size-th term is stored completely, so a block can be decoded on
+# its own.
+#
+# file format (all numbers are varints):
+#   magic, number of terms, block size
+#   per term: shared prefix length, suffix length, suffix (utf-8), term id
+
+magic = b"IRTMLEX1"
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    """
+    returns the value and the position after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def shared_prefix(a, b):
+    length = min(len(a), len(b))
+    i = 0
+    while i < length and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def front_code(terms, block_size=16):
+    """
+    sorted (term, id) pairs as front coded bytes
+    """
+    out = bytearray()
+    previous = b""
+    for n, (term, term_id) in enumerate(terms):
+        term = term.encode("utf-8")
+        prefix = 0 if n % block_size == 0 else shared_prefix(previous, term)
+        write_varint(out, prefix)
+        write_varint(out, len(term) - prefix)
+        out += term[prefix:]
+        write_varint(out, term_id)
+        previous = term
+    return bytes(out)
+
+
+def front_decode(data, pos, count):
+    """
+    decode count (term, id) pairs starting at pos, returns them and the
+    position after the last one
+    """
+    result = []
+    previous = b""
+    for _ in range(count):
+        prefix, pos = read_varint(data, pos)
+        length, pos = read_varint(data, pos)
+        term = previous[:prefix] + data[pos:pos + length]
+        pos += length
+        term_id, pos = read_varint(data, pos)
+        result.append((term.decode("utf-8"), term_id))
+        previous = term
+    return result, pos
+
+
+class Lexicon:
+    """
+    term <-> dense integer id
+    """
+    def __init__(self, terms=()):
+        self.terms = []
+        self.ids = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        """
+        id of term, a new one if the term is unknown
+        """
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def get(self, term, default=None):
+        return self.ids.get(term, default)
+
+    def __getitem__(self, term):
+        return self.ids[term]
+
+    def __contains__(self, term):
+        return term in self.ids
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def term(self, term_id):
+        return self.terms[term_id]
+
+    def encode(self, terms, add=False):
+        """
+        ids of terms as an array, unknown terms are added or become -1
+        """
+        if add:
+            return np.array([self.add(term) for term in terms], dtype=np.int64)
+        return np.array([self.ids.get(term, -1) for term in terms],
+                        dtype=np.int64)
+
+    def sorted_items(self):
+        """
+        (term, id) pairs in sorted term order
+        """
+        return sorted(self.ids.items())
+
+    def save(self, filename, block_size=16):
+        """
+        write the sorted, front coded string table with the ids
+        """
+        out = bytearray(magic)
+        write_varint(out, len(self.terms))
+        write_varint(out, block_size)
+        out += front_code(self.sorted_items(), block_size)
+        with open(filename, "wb") as file:
+            file.write(out)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as file:
+            data = file.read()
+        if not data.startswith(magic):
+            raise ValueError("not a lexicon file: " + filename)
+        count, pos = read_varint(data, len(magic))
+        block_size, pos = read_varint(data, pos)
+        items, pos = front_decode(data, pos, count)
+        lexicon = cls()
+        lexicon.terms = [None] * count
+        for term, term_id in items:
+            lexicon.terms[term_id] = term
+            lexicon.ids[term] = term_id
+        return lexicon
+
+
+class FrontCodedLexicon:
+    """
+    Read only sorted term dictionary, kept front coded in memory: only the
+    first term of every block is a Python string (for the binary search),
+    all other terms are decoded on demand from one bytes object.
+    Supports exact lookup, prefix ranges and wildcard patterns. For patterns
+    starting with * a second dictionary of the reversed terms is used (like
+    a reverse B-tree), so only leading *and* trailing wildcards need a scan.
+    """
+    def __init__(self, items, block_size=16, with_reversed=True):
+        """
+        items: (term, id) pairs, they get sorted
+        """
+        items = sorted(items)
+        self.block_size = block_size
+        self.count = len(items)
+        self.data = front_code(items, block_size)
+        self.first_terms = [term for term, _ in items[::block_size]]
+        self.block_offsets = np.zeros(len(self.first_terms), dtype=np.int64)
+        # find where each block starts in data
+        pos = 0
+        for block in range(len(self.first_terms)):
+            self.block_offsets[block] = pos
+            _, pos = front_decode(self.data, pos, self.block_length(block))
+        self.reversed = None
+        if with_reversed:
+            self.reversed = FrontCodedLexicon(
+                [(term[::-1], term_id) for term, term_id in items],
+                block_size, with_reversed=False)
+
+    @classmethod
+    def from_lexicon(cls, lexicon, block_size=16):
+        return cls(lexicon.ids.items(), block_size)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        read a file written by Lexicon.save()
+        """
+        return cls.from_lexicon(Lexicon.load(filename))
+
+    def __len__(self):
+        return self.count
+
+    def block_length(self, block):
+        return min(self.block_size, self.count - block * self.block_size)
+
+    def block(self, block):
+        """
+        all (term, id) pairs of a block
+        """
+        items, _ = front_decode(self.data, int(self.block_offsets[block]),
+                                self.block_length(block))
+        return items
+
+    def find_block(self, term):
+        """
+        the block which would contain term
+        """
+        return max(bisect_right(self.first_terms, term) - 1, 0)
+
+    def get(self, term, default=None):
+        if self.count == 0:
+            return default
+        for candidate, term_id in self.block(self.find_block(term)):
+            if candidate == term:
+                return term_id
+        return default
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def items(self, start=""):
+        """
+        (term, id) pairs in sorted order, starting at the first term >= start
+        """
+        if self.count == 0:
+            return
+        for block in range(self.find_block(start), len(self.first_terms)):
+            for term, term_id in self.block(block):
+                if term >= start:
+                    yield term, term_id
+
+    def prefix(self, prefix):
+        """
+        (term, id) pairs of all terms starting with prefix
+        """
+        for term, term_id in self.items(prefix):
+            if not term.startswith(prefix):
+                break
+            yield term, term_id
+
+    def wildcard(self, pattern):
+        """
+        (term, id) pairs of all terms matching a pattern with * (any
+        characters) and ? (one character), e.g. "stutt*", "*gart", "st*t"
+        """
+        if "*" not in pattern and "?" not in pattern:
+            term_id = self.get(pattern)
+            return [] if term_id is None else [(pattern, term_id)]
+        with metrics.latency("query.wildcard"):
+            # the literal text before the first and after the last wildcard
+            head = re.split(r"[*?]", pattern, 1)[0]
+            tail = re.split(r"[*?]", pattern)[-1]
+            matcher = re.compile(fnmatch.translate(pattern))
+            if len(head) >= len(tail) or self.reversed is None:
+                candidates = self.prefix(head)
+            else:
+                candidates = ((term[::-1], term_id) for term, term_id
+                              in self.reversed.prefix(tail[::-1]))
+            return sorted((term, term_id) for term, term_id in candidates
+                          if matcher.match(term))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+from contextlib import redirect_stdout
+import importlib.util
+import io
+import json
+import os
+import sys
+import types
+import numpy as np
+
+# Memory footprint of built indexes: the deep size of every index structure
+# (the object and everything it references, each object counted once), its
+# number of entries and, for the postings structures of an engine (term ->
+# collection of documents), the number of postings, bytes per posting and
+# the largest lists. Arrays count their buffer only if they own it, so views
+# of shared memory or memory mapped files count as their header.
+#
+# memory.py uebung1|uebung2|uebung3 [tweet file] [--json]
+
+# index structures of the engines, as module level names, and the names of
+# those which are postings (other term -> collection structures, e.g. the
+# spelling suggestions, are not)
+engines = {
+    "uebung1": ("uebung1/tweets.py", ["postings", "lexicon",
+                                      "term_dictionary", "metadata"],
+                ["postings"]),
+    "uebung2": ("uebung2/tweets.py", ["postings", "inv_index", "suggestions",
+                                      "correct_spelling"], ["postings"]),
+    "uebung3": ("uebung3/tf_idf.py", ["postings", "lexicon",
+                                      "term_dictionary", "metadata"],
+                ["postings"]),
+}
+
+# objects which belong to the program, not to an index
+skipped = (type, types.ModuleType, types.FunctionType, types.MethodType,
+           types.BuiltinFunctionType)
+
+
+def deep_size(structure, seen=None):
+    """
+    bytes of an object and all objects it references, objects in seen (ids)
+    are not counted again and new ones are added
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [structure]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, skipped):
+            continue
+        seen.add(id(obj))
+        # numpy arrays report their buffer only if they own it
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, np.ndarray):
+            continue
+        elif hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+    return total
+
+
+def postings_lists(structure):
+    """
+    (keys, sizes) of postings: a dict of collections, a list of collections
+    (indexed by term id) or array postings (offsets), None otherwise
+    """
+    collections = (set, frozenset, list, dict)
+    if hasattr(structure, "offsets") and hasattr(structure, "docs"):
+        return None, np.diff(structure.offsets)
+    if isinstance(structure, dict) and structure and \
+            all(isinstance(value, collections)
+                for value in structure.values()):
+        return list(structure.keys()), np.array(
+            [len(value) for value in structure.values()], dtype=np.int64)
+    if isinstance(structure, list) and structure and \
+            all(isinstance(value, collections) for value in structure):
+        return None, np.array([len(value) for value in structure],
+                              dtype=np.int64)
+    return None
+
+
+def profile(name, structure, terms=None, largest=5, postings=False):
+    """
+    report of one structure as a dict, with the postings statistics if it
+    is postings
+    terms: names of the list positions (e.g. lexicon.terms)
+    """
+    row = {"name": name, "bytes": deep_size(structure)}
+    if hasattr(structure, "__len__"):
+        row["entries"] = len(structure)
+    lists = postings_lists(structure) if postings else None
+    if lists is not None:
+        keys, sizes = lists
+        if keys is None and terms is not None and len(terms) == len(sizes):
+            keys = terms
+        postings = int(sizes.sum())
+        row["postings"] = postings
+        row["bytes_per_posting"] = row["bytes"] / postings if postings \
+            else 0.0
+        top = np.argsort(-sizes, kind="stable")[:largest]
+        row["largest"] = [(str(keys[i]) if keys is not None else int(i),
+                           int(sizes[i])) for i in top]
+    return row
+
+
+def report(structures, terms=None, postings=()):
+    """
+    rows for name -> structure and the total, objects shared between
+    structures are counted once in the total
+    postings: names of the structures which are postings
+    """
+    rows = [profile(name, structure, terms, postings=name in postings)
+            for name, structure in structures.items()]
+    seen = set()
+    total = sum(deep_size(structure, seen)
+                for structure in structures.values())
+    rows.append({"name": "total", "bytes": total})
+    return rows
+
+
+def module_report(module, names, postings=("postings",)):
+    """
+    rows for the structures of an engine module, the vocabulary size is the
+    number of terms in its lexicon (or postings)
+    """
+    structures = {name: getattr(module, name) for name in names
+                  if hasattr(module, name)}
+    lexicon = getattr(module, "lexicon", None)
+    terms = getattr(lexicon, "terms", None)
+    rows = report(structures, terms, postings)
+    vocabulary = len(terms) if terms is not None \
+        else len(getattr(module, "postings", ()))
+    rows.append({"name": "vocabulary", "entries": vocabulary})
+    return rows
+
+
+def format_report(rows):
+    lines = ["%-18s %12s %10s %12s %10s  %s" % (
+        "structure", "MB", "entries", "postings", "B/posting", "largest")]
+    for row in rows:
+        lines.append("%-18s %12s %10s %12s %10s  %s" % (
+            row["name"],
+            "%.2f" % (row["bytes"] / 1e6) if "bytes" in row else "",
+            row.get("entries", ""), row.get("postings", ""),
+            "%.1f" % row["bytes_per_posting"]
+            if "bytes_per_posting" in row else "",
+            ", ".join("%s:%d" % item for item in row.get("largest", []))))
+    return "\n".join(lines)
+
+
+def load_engine(engine, filename):
+    """
+    import the module of an engine from its file and index a tweet file
+    """
+    path, names, postings = engines[engine]
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+    path = os.path.join(root, path)
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(engine, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # the indexers print their progress
+    with redirect_stdout(io.StringIO()):
+        module.index(filename)
+    return module, names, postings
+
+
+def main(engine="uebung3", filename="tweets", as_json=False):
+    module, names, postings = load_engine(engine, filename)
+    rows = module_report(module, names, postings)
+    if as_json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_report(rows))
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--json"]
+    main(*args[:2], as_json="--json" in sys.argv)
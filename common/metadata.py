@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+from datetime import datetime, timezone
+import numpy as np
+
+from lexicon import Lexicon
+
+# Per document metadata of a tweet corpus, stored column wise as arrays
+# indexed by docID, so queries can filter by date or user and scorers can
+# look up document lengths without reading the tweet file again.
+#
+# tweet file format (tab separated):
+#   timestamp, tweet id, @user, name, text
+
+time_format = "%Y-%m-%d %H:%M:%S %z"
+
+
+def parse_time(text):
+    """
+    seconds since the epoch of a tweet timestamp like
+    "2016-08-20 19:06:11 +0200" or a date like "2016-08-20" (UTC),
+    -1 if it can not be parsed
+    """
+    try:
+        return int(datetime.strptime(text, time_format).timestamp())
+    except ValueError:
+        pass
+    try:
+        return int(datetime.strptime(text, "%Y-%m-%d")
+                   .replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return -1
+
+
+def tweet_labels(line):
+    """
+    (timestamp, tweet id, user) columns of a tweet line
+    """
+    columns = line.rstrip("\n").split("\t")
+    if len(columns) < 3:
+        return ("", "", "")
+    return (columns[0], columns[1], columns[2])
+
+
+def parse_filters(terms):
+    """
+    split query terms into search terms and filters:
+    since:2016-08-20, until:2016-08-21 and from:@user
+    """
+    remaining = []
+    filters = {}
+    for term in terms:
+        key, _, value = term.partition(":")
+        if value and key in ("since", "until"):
+            filters[key] = value
+        elif value and key == "from":
+            filters.setdefault("users", []).append(value)
+        else:
+            remaining.append(term)
+    return remaining, filters
+
+
+class Metadata:
+    """
+    tweet id, timestamp, user and length (number of tokens) of every
+    document as arrays, users are stored as ids of a Lexicon
+    """
+    def __init__(self, labels=(), lengths=()):
+        """
+        labels: (timestamp, tweet id, user) per document, see tweet_labels()
+        lengths: number of tokens per document
+        """
+        count = len(labels)
+        self.users = Lexicon()
+        self.tweet_ids = np.full(count, -1, dtype=np.int64)
+        self.timestamps = np.full(count, -1, dtype=np.int64)
+        self.user_ids = np.full(count, -1, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        for d, (timestamp, tweet_id, user) in enumerate(labels):
+            self.timestamps[d] = parse_time(timestamp)
+            if tweet_id.isdigit():
+                self.tweet_ids[d] = int(tweet_id)
+            if user:
+                self.user_ids[d] = self.users.add(user)
+        self.average_length = float(self.lengths.mean()) if count else 0.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def select(self, since=None, until=None, users=None):
+        """
+        boolean mask of the documents matching all given filters
+        since and until are timestamps or dates (since inclusive, until
+        exclusive), users a list of user names like "@user"
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if since is not None:
+            if isinstance(since, str):
+                since = parse_time(since)
+            mask &= self.timestamps >= since
+        if until is not None:
+            if isinstance(until, str):
+                until = parse_time(until)
+            mask &= (self.timestamps < until) & (self.timestamps >= 0)
+        if users is not None:
+            user_ids = [self.users.get(user) for user in users]
+            mask &= np.isin(self.user_ids,
+                            [i for i in user_ids if i is not None])
+        return mask
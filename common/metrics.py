@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+from contextlib import contextmanager
+from functools import wraps
+import json
+import math
+import os
+import time
+
+# In process metrics: timers, counters, latency histograms and cache hit
+# rates, kept in plain dicts so recording one value only costs a dict lookup
+# and an addition. Meant for stages and queries, not for every token.
+# Every process has its own metrics (e.g. every worker of a pool).
+# IRTM_METRICS=0 turns recording off.
+
+enabled = os.environ.get("IRTM_METRICS", "1") != "0"
+
+# name -> [calls, total seconds, min seconds, max seconds]
+timers = {}
+# name -> value
+counters = {}
+# name -> count per bucket, bucket b holds latencies up to 2 ** b microseconds
+histograms = {}
+buckets = 32
+
+
+def count(name, value=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + value
+
+
+def record(name, seconds):
+    """
+    add a duration to a timer
+    """
+    if not enabled:
+        return
+    timer = timers.get(name)
+    if timer is None:
+        timers[name] = [1, seconds, seconds, seconds]
+        return
+    timer[0] += 1
+    timer[1] += seconds
+    if seconds < timer[2]:
+        timer[2] = seconds
+    if seconds > timer[3]:
+        timer[3] = seconds
+
+
+def observe(name, seconds):
+    """
+    add a latency to the histogram (and the timer) of the same name
+    """
+    if not enabled:
+        return
+    record(name, seconds)
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = [0] * buckets
+    bucket = math.frexp(seconds * 1e6)[1]
+    histogram[min(max(bucket, 0), buckets - 1)] += 1
+
+
+@contextmanager
+def timer(name):
+    """
+    with timer("index.postings"): ... adds the time of the block to a timer
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def latency(name):
+    """
+    like timer(), but the time also goes into a latency histogram
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """
+    decorator, adds the time of every call to a timer
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache(name, hit):
+    """
+    count a hit or a miss of a cache
+    """
+    count(name + (".hits" if hit else ".misses"))
+
+
+def percentile(histogram, fraction):
+    """
+    upper bound (in seconds) of the latency below which the fraction of all
+    values lies
+    """
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    seen = 0
+    for bucket, amount in enumerate(histogram):
+        seen += amount
+        if seen >= fraction * total:
+            return 2.0 ** bucket / 1e6
+    return 2.0 ** (len(histogram) - 1) / 1e6
+
+
+def snapshot():
+    """
+    all metrics as a dict of plain values
+    """
+    caches = {}
+    for name, value in counters.items():
+        for suffix in (".hits", ".misses"):
+            if name.endswith(suffix):
+                caches.setdefault(name[:-len(suffix)], {"hits": 0,
+                                                        "misses": 0})
+                caches[name[:-len(suffix)]][suffix[1:]] = value
+    for entry in caches.values():
+        lookups = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = entry["hits"] / float(lookups) if lookups else 0.0
+    return {
+        "timers": {name: {"calls": calls, "seconds": total,
+                          "mean": total / calls, "min": low, "max": high}
+                   for name, (calls, total, low, high) in timers.items()},
+        "counters": dict(counters),
+        "histograms": {name: {"count": sum(histogram),
+                              "p50": percentile(histogram, 0.5),
+                              "p90": percentile(histogram, 0.9),
+                              "p99": percentile(histogram, 0.99),
+                              "buckets": list(histogram)}
+                       for name, histogram in histograms.items()},
+        "caches": caches,
+    }
+
+
+def dump(filename=None):
+    """
+    all metrics as JSON, written to filename if given
+    """
+    text = json.dumps(snapshot(), indent=2, sort_keys=True)
+    if filename is not None:
+        with open(filename, "w") as file:
+            file.write(text + "\n")
+    return text
+
+
+def reset():
+    timers.clear()
+    counters.clear()
+    histograms.clear()
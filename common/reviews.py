@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import csv
+
+import corpus_cache
+
+# Tokenizer of the games review files (game, class, title, text; tab
+# separated), shared by the Naive Bayes classifier and the feature export so
+# both use the same terms and the same corpus cache entries. The cache config
+# is built from the parameters of the tokenizer here, bump version whenever
+# tokenize or normalize change.
+# The file is parsed as a whole by one csv reader (like the original loaders
+# of nb.py and data_export.py), so a quoted field may contain tabs and line
+# breaks and a review is never split at them.
+
+stop_words = {"aber", "alle", "allem", "allen", "aller", "alles", "als", "also", "am", "an", "ander", "andere",
+              "anderem", "anderen", "anderer", "anderes", "anderm", "andern", "anders", "auch", "auf", "aus", "bei",
+              "bin", "bis", "bist", "da", "damit", "dann", "das", "dass", "dasselbe", "dazu", "daß", "dein", "deine",
+              "deinem", "deinen", "deiner", "deines", "dem", "demselben", "den", "denn", "denselben", "der", "derer",
+              "derselbe", "derselben", "des", "desselben", "dessen", "dich", "die", "dies", "diese", "dieselbe",
+              "dieselben", "diesem", "diesen", "dieser", "dieses", "dir", "doch", "dort", "du", "durch", "ein", "eine",
+              "einem", "einen", "einer", "eines", "einig", "einige", "einigem", "einigen", "einiger", "einiges",
+              "einmal", "er", "es", "etwas", "euch", "euer", "eure", "eurem", "euren", "eurer", "eures", "für", "gegen",
+              "gewesen", "hab", "habe", "haben", "hat", "hatte", "hatten", "hier", "hin", "hinter", "ich", "ihm", "ihn",
+              "ihnen", "ihr", "ihre", "ihrem", "ihren", "ihrer", "ihres", "im", "in", "indem", "ins", "ist",
+              "jede", "jedem", "jeden", "jeder", "jedes", "jene", "jenem", "jenen", "jener", "jenes", "jetzt", "kann",
+              "kein", "keine", "keinem", "keinen", "keiner", "keines", "können", "könnte", "machen", "man", "mal",
+              "manche", "manchem", "manchen", "mancher", "manches", "mein", "meine", "meinem", "meinen", "meiner",
+              "meines", "mich", "mir", "mit", "muss", "musste", "nach", "nicht", "nichts", "noch", "nun", "nur", "ob",
+              "oder", "ohne", "sehr", "sein", "seine", "seinem", "seinen", "seiner", "seines", "selbst", "sich", "sie",
+              "sind", "so", "solche", "solchem", "solchen", "solcher", "solches", "soll", "sollte", "sondern", "sonst",
+              "um", "und", "uns", "unser", "unsere", "unserem", "unseren", "unserer", "unseres", "unter", "viel", "vom",
+              "von", "vor", "war", "waren", "warst", "was", "weg", "weil", "weiter", "welche", "welchem", "welchen",
+              "welcher", "welches", "wenn", "werde", "werden", "wie", "wieder", "will", "wir", "wird", "wirst", "wo",
+              "wollen", "wollte", "während", "würde", "würden", "zu", "zum", "zur", "zwar", "zwischen", "über"}
+max_length = 20
+version = 2
+config = ("reviews.tokenize", version, max_length, sorted(stop_words))
+
+
+def normalize(term):
+    """
+    normalize word and remove useless stuff
+    """
+    return term.lower(). \
+        replace(":", ""). \
+        replace(";", ""). \
+        replace(".", ""). \
+        replace(",", ""). \
+        replace("/", ""). \
+        replace("#", ""). \
+        replace("!", ""). \
+        replace("?", ""). \
+        replace("(", ""). \
+        replace(")", ""). \
+        replace("'", ""). \
+        replace("\"", "")
+
+
+def read(file):
+    """
+    the rows of an open review file
+    """
+    return csv.reader(file, delimiter='\t')
+
+
+def tokenize(i):
+    """
+    game and class of a review row and the normalized words of title and text
+    """
+    fields = []
+    for text in i[2:4]:
+        words = []
+        for word in text.split(" "):
+            norm = normalize(word)
+            if 0 < len(norm) <= max_length and norm not in stop_words:
+                words.append(norm)
+        fields.append(words)
+    return (i[0], i[1]), fields
+
+
+def load_csv(filename):
+    """
+    [game, class, title words, text words] of every review, from the corpus
+    cache if possible
+    """
+    corpus = corpus_cache.load(filename, tokenize, config, read)
+    result = list()
+    for (game, label), (tmp1, tmp2) in corpus_cache.documents(corpus):
+        result.append([game, label, tmp1, tmp2])
+    return result
@@ -0,0 +1,67 @@
+import pytest
+
+from lexicon import FrontCodedLexicon, Lexicon
+
+terms = ["stuttgart", "stute", "sturm", "berlin", "bern", "gart", "start",
+         "stadt", "art"]
+
+
+@pytest.fixture
+def lexicon():
+    return Lexicon(terms)
+
+
+def test_lexicon_ids(lexicon):
+    assert lexicon["stuttgart"] == 0
+    assert lexicon.add("stuttgart") == 0
+    assert lexicon.add("neu") == len(terms)
+    assert lexicon.get("missing") is None
+    assert list(lexicon.encode(["bern", "missing"])) == [4, -1]
+    assert lexicon.term(3) == "berlin"
+
+
+def test_save_and_load(lexicon, tmp_path):
+    filename = str(tmp_path / "terms.lex")
+    lexicon.save(filename, block_size=2)
+    loaded = Lexicon.load(filename)
+    assert loaded.terms == lexicon.terms
+    assert FrontCodedLexicon.load(filename).get("sturm") == lexicon["sturm"]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 16])
+def test_exact_lookup(lexicon, block_size):
+    dictionary = FrontCodedLexicon.from_lexicon(lexicon, block_size)
+    assert len(dictionary) == len(terms)
+    for term in terms:
+        assert dictionary.get(term) == lexicon[term]
+    assert dictionary.get("stu") is None
+    assert dictionary.get("aaa") is None
+    assert dictionary.get("zzz") is None
+    assert "bern" in dictionary
+    assert dictionary.wildcard("bern") == [("bern", lexicon["bern"])]
+    assert dictionary.wildcard("missing") == []
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 16])
+def test_prefix(lexicon, block_size):
+    dictionary = FrontCodedLexicon.from_lexicon(lexicon, block_size)
+    assert [term for term, _ in dictionary.prefix("stu")] == \
+        ["sturm", "stute", "stuttgart"]
+    assert list(dictionary.prefix("x")) == []
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    ("stu*", ["sturm", "stute", "stuttgart"]),
+    ("*gart", ["gart", "stuttgart"]),
+    ("*art", ["art", "gart", "start", "stuttgart"]),
+    ("st*t", ["stadt", "start", "stuttgart"]),
+    ("*er*", ["berlin", "bern"]),
+    ("ber?", ["bern"]),
+    ("?art", ["gart"]),
+    ("st??t", ["stadt", "start"]),
+    ("b*x", []),
+])
+def test_wildcard(lexicon, pattern, expected):
+    dictionary = FrontCodedLexicon.from_lexicon(lexicon, block_size=2)
+    assert dictionary.wildcard(pattern) == \
+        [(term, lexicon[term]) for term in expected]
@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+import corpus_cache  # noqa: E402
+from lexicon import FrontCodedLexicon, Lexicon  # noqa: E402
+from metadata import Metadata, tweet_labels  # noqa: E402
+import metrics  # noqa: E402
 
 name = ""
-inv_index = defaultdict(list)
-postings = defaultdict(set)
+# postings lists (sets of docIDs), indexed by term id
+postings = []
+lexicon = Lexicon()
+# sorted, front coded copy of the lexicon for prefix and wildcard queries
+term_dictionary = FrontCodedLexicon([])
+# per document: tweet id, timestamp, user and length
+metadata = Metadata()
 stop_words = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
               'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the',
               'to', 'was', 'were', 'will', 'with'}
@@ -23,41 +36,61 @@ def normalize(term):
         replace("#", "")
 
 
+def tokenize(line):
+    """
+    normalized terms of a line without stop words, the metadata columns are
+    the labels
+    """
+    terms = []
+    # split them to list of terms
+    for term in line.split():
+        # remove clutter
+        term = normalize(term)
+        # check if term is in stop words to save some memory
+        if term in stop_words:
+            continue
+        terms.append(term)
+    return tweet_labels(line), [terms]
+
+
 def index(filename):
     """
     indexes a given file and saves terms to a posting and non-positional inverted index
     """
     global name
+    global lexicon
+    global postings
+    global term_dictionary
+    global metadata
     name = filename
     try:
-        # open file
-        with open(filename, "r") as file:
-            docID = 0
-            # iterate over each line in file
-            for line in file:
-                # split them to list of terms
-                tweet = line.split()
-
-                for term in tweet:
-                    # remove clutter
-                    term = normalize(term)
-                    # check if term is in stop words to save some memory
-                    if term in stop_words:
-                        continue
-                    # add docID
-                    postings[term].add(docID)
-                    # update inv_index
-                    # we use the term as pointer, because python does not
-                    # support pointers, and storing int by indexes will have an
-                    # massive overhead
-                    inv_index[term] = (len(postings[term]), term)
-                # increase line number counter
-                docID += 1
-                # this is for displaying a progress while indexing
-                if docID % 10000 == 0:
-                    print(str(int(docID / 10000)) + " %")
+        # tokenized file, from the corpus cache if it was tokenized before
+        corpus = corpus_cache.load(
+            filename, tokenize, ("uebung1/tweets.py", 2, sorted(stop_words)))
     except FileNotFoundError as e:
         raise SystemExit("Could not open file: " + str(e))
+    # the corpus already numbered its terms, the term id is the position
+    # of the postings list
+    lexicon = Lexicon(corpus.terms)
+    metadata = Metadata(corpus.labels, [len(tweet) for labels, (tweet,)
+                                        in corpus_cache.document_ids(corpus)])
+    postings = [set() for _ in range(len(lexicon))]
+    docID = 0
+    with metrics.timer("index.postings"):
+        # iterate over each tokenized line
+        for labels, (tweet,) in corpus_cache.document_ids(corpus):
+            for term_id in tweet:
+                # add docID
+                postings[term_id].add(docID)
+            # increase line number counter
+            docID += 1
+            # this is for displaying a progress while indexing
+            if docID % 10000 == 0:
+                print(str(int(docID / 10000)) + " %")
+    metrics.count("index.documents", docID)
+    metrics.count("index.terms", len(lexicon))
+    metrics.count("index.postings", sum(len(docs) for docs in postings))
+    term_dictionary = FrontCodedLexicon.from_lexicon(lexicon)
     return
 
 
@@ -75,48 +108,66 @@ def getLines(lines):
     return result
 
 
-def query(term1, term2=""):
+def documents(term):
+    """
+    sorted docIDs of a term, a term with * or ? (e.g. "stutt*") matches every
+    term of the wildcard pattern and gives the union of their postings
+    """
+    if "*" not in term and "?" not in term:
+        # the term id is the position of the postings list
+        term_id = lexicon.get(term)
+        if term_id is None:
+            return []
+        return sorted(postings[term_id])
+    result = set()
+    for matching_term, term_id in term_dictionary.wildcard(term):
+        result |= postings[term_id]
+    return sorted(result)
+
+
+def query(term1, term2="", since=None, until=None, users=None):
     """
     you can query your search terms. If only one term given it only searches
     for one, otherwise they both have to exist in the tweet
+    since, until (dates like "2016-08-20") and users (like ["@user"]) filter
+    the tweets by their metadata
     """
     lines = []
-    # remove clutter
-    term1 = normalize(term1)
-    term2 = normalize(term2)
-    # if only one term given look for it
-    if term1 in inv_index and not term2:
-        (postings_len, postings_pointer) = inv_index[term1]
-        # the sorted document_id list out of the postings_list
-        lines = sorted(list(postings[postings_pointer]))
-    # if two terms are given look for both
-    elif term2 and term2 in inv_index:
-        (postings_len, postings_pointer) = inv_index[term1]
-        # the sorted document_id list out of the postings_list
-        lines1 = sorted(list(postings[postings_pointer]))
-        (postings_len, postings_pointer) = inv_index[term2]
-        # the sorted document_id list out of the postings_list
-        lines2 = sorted(list(postings[postings_pointer]))
-        # init of iterators
-        listiter1 = iter(lines1)
-        listiter2 = iter(lines2)
-        tmp1 = -1
-        tmp2 = -1
-        # and intersect the lists to see which lines match both terms
-        # if the have the same lines, it will be added to 'lines'
-        while True:
-            try:
-                # like discused in the lesson
-                if tmp1 <= tmp2:
-                    tmp1 = next(listiter1)
-                else:
-                    tmp2 = next(listiter2)
-                if tmp1 == tmp2:
-                    lines.append(tmp1)
-            except StopIteration:
-                break
-    else:
-        print("nothing found")
+    with metrics.latency("query.boolean"):
+        # remove clutter
+        term1 = normalize(term1)
+        term2 = normalize(term2)
+        # the sorted document_id lists out of the postings_lists
+        lines1 = documents(term1)
+        lines2 = documents(term2) if term2 else []
+        # if only one term given look for it
+        if lines1 and not term2:
+            lines = lines1
+        # if two terms are given look for both
+        elif lines1 and lines2:
+            # init of iterators
+            listiter1 = iter(lines1)
+            listiter2 = iter(lines2)
+            tmp1 = -1
+            tmp2 = -1
+            # and intersect the lists to see which lines match both terms
+            # if the have the same lines, it will be added to 'lines'
+            while True:
+                try:
+                    # like discused in the lesson
+                    if tmp1 <= tmp2:
+                        tmp1 = next(listiter1)
+                    else:
+                        tmp2 = next(listiter2)
+                    if tmp1 == tmp2:
+                        lines.append(tmp1)
+                except StopIteration:
+                    break
+        else:
+            print("nothing found")
+        if since is not None or until is not None or users is not None:
+            selected = metadata.select(since, until, users)
+            lines = [line for line in lines if selected[line]]
     # we could end here, but we want to get the lines from the file
     return getLines(lines)
 
@@ -126,3 +177,4 @@ if __name__ == '__main__':
     print("finished indexing")
     # print(query("geldern"))
     print(query("stuttgart", "bahn"))
+    # print(query("stutt*", "bahn"))
@@ -2,9 +2,14 @@
 
 from collections import defaultdict
 import numpy as np
+import os
 import sys
 import re
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+import corpus_cache  # noqa: E402
+
 name = ""
 inv_index = defaultdict(list)
 correct_spelling = defaultdict()
@@ -62,6 +67,22 @@ def normalize(term):
         replace("\"", "")
 
 
+def tokenize(line):
+    """
+    normalized terms of a line, only alphabetic ones and no stop words
+    """
+    terms = []
+    # split them to list of terms
+    for term in line.split():
+        # remove clutter
+        term = normalize(term)
+        # check if term is in stop words to save some memory
+        if not str.isalpha(term) or (term in stop_words):
+            continue
+        terms.append(term)
+    return (), [terms]
+
+
 def index(filename):
     """
     indexes a given file and saves terms to a posting and
@@ -70,39 +91,32 @@ def index(filename):
     global name
     name = filename
     try:
-        # open file
-        with open(filename, "r") as file:
-            docID = 0
-            # iterate over each line in file
-            for line in file:
-                # split them to list of terms
-                tweet = line.split()
-
-                for term in tweet:
-                    # remove clutter
-                    term = normalize(term)
-                    # check if term is in stop words to save some memory
-                    if not str.isalpha(term) or (term in stop_words):
-                        continue
-                    # print(term)
-                    addSuggestions(term)
-                    # add docID
-                    postings[term].add(docID)
-                    # update inv_index
-                    # we use the term as pointer, because python does not
-                    # support pointers, and storing int by indexes will have an
-                    # massive overhead
-                    inv_index[term] = (len(postings[term]), term)
-                # increase line number counter
-                docID += 1
-                # this is for displaying a progress while indexing
-                if docID % 10000 == 0:
-                    sys.stdout.write("\r{0} %".format(int(int(docID) / 10000)))
-                    sys.stdout.flush()
-                # if docID >= 100000:
-                #     break
+        # tokenized file, from the corpus cache if it was tokenized before
+        corpus = corpus_cache.load(
+            filename, tokenize, ("uebung2/tweets.py", 1, sorted(stop_words)))
     except FileNotFoundError as e:
         raise SystemExit("Could not open file: " + str(e))
+    docID = 0
+    # iterate over each tokenized line
+    for labels, (tweet,) in corpus_cache.documents(corpus):
+        for term in tweet:
+            # print(term)
+            addSuggestions(term)
+            # add docID
+            postings[term].add(docID)
+            # update inv_index
+            # we use the term as pointer, because python does not
+            # support pointers, and storing int by indexes will have an
+            # massive overhead
+            inv_index[term] = (len(postings[term]), term)
+        # increase line number counter
+        docID += 1
+        # this is for displaying a progress while indexing
+        if docID % 10000 == 0:
+            sys.stdout.write("\r{0} %".format(int(int(docID) / 10000)))
+            sys.stdout.flush()
+        # if docID >= 100000:
+        #     break
     return
 
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import time
+import numpy as np
+
+import scoring
+
+# Impact ordered postings for fast top k retrieval.
+# The weight of every posting (from a fitted scorer) is quantized to 8 bits,
+# relative to the largest weight of its term, so short and long lists keep
+# the same precision. The postings of a term are sorted by that impact, so
+# documents with equal impact form a segment. A query processes the segments
+# of all its terms score at a time, the largest query weight * impact first,
+# and can stop after a budget of postings: the highest scores are usually
+# complete after a small prefix of every list. Only the documents of the
+# processed segments are touched, no array over all documents is created.
+# Without a budget a query is slower than exhaustive scoring, the documents
+# of a list are not in order, so the index pays off with a budget.
+# Optionally the low impact tail of every list is pruned at build time.
+
+
+class ImpactIndex:
+    """
+    scorer: a fitted scoring.Scorer, its document weights are the impacts
+    (for TfIdfCosine the final cosine normalization is not applied, the
+    scores are the tf-idf dot products)
+    keep: fraction of every postings list which is kept, the rest (with the
+    lowest impacts) is pruned, at least one posting per term is kept
+    """
+    def __init__(self, scorer, bits=8, keep=1.0):
+        self.scorer = scorer
+        postings = scorer.postings
+        self.count = scorer.count
+        levels = (1 << bits) - 1
+        terms = scorer.term_of_posting
+        # per term: the weight of one impact level
+        largest = np.zeros(len(scorer.sizes), dtype=np.float64)
+        np.maximum.at(largest, terms, scorer.weights)
+        self.scales = np.where(largest > 0, largest / levels, 1.0)
+        # impacts 1..levels, a posting never gets impact 0
+        impacts = np.clip(np.rint(scorer.weights / self.scales[terms]), 1,
+                          levels)
+        self.dtype = np.uint8 if bits <= 8 else np.uint16
+        # sort by term, then impact descending, then document
+        order = np.lexsort((postings.docs, -impacts, terms))
+        terms = terms[order]
+        # drop the tails of the lists which are not kept
+        rank = np.arange(len(order)) - postings.offsets[terms]
+        kept = np.maximum(np.ceil(scorer.sizes * keep), 1).astype(np.int64)
+        mask = rank < kept[terms]
+        order = order[mask]
+        terms = terms[mask]
+        self.docs = postings.docs[order]
+        self.impacts = impacts[order].astype(self.dtype)
+        self.offsets = np.zeros(len(scorer.sizes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(scorer.sizes)),
+                  out=self.offsets[1:])
+        # a segment starts at every change of term or impact
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = (terms[1:] != terms[:-1]) | \
+            (self.impacts[1:] != self.impacts[:-1])
+        self.segments = np.append(np.flatnonzero(starts), len(order))
+        self.segment_terms = terms[self.segments[:-1]]
+        # scores of the documents of a query, reset after every query
+        self.buffer = np.zeros(self.count, dtype=np.float64)
+
+    def __len__(self):
+        """
+        number of postings in the index
+        """
+        return len(self.docs)
+
+    def score(self, counts, budget=None):
+        """
+        approximate scores for the term id -> count of a query, after
+        processing at most budget postings (all if None)
+        returns the scored documents and their scores, for
+        scoring.top(scores, k, selected, docs)
+        """
+        query = self.scorer.query_weights(counts)
+        terms = np.array(list(query), dtype=np.int64)
+        weights = np.array(list(query.values()), dtype=np.float64) * \
+            self.scales[terms]
+        # segments of the query terms
+        first = np.searchsorted(self.segment_terms, terms, side="left")
+        last = np.searchsorted(self.segment_terms, terms, side="right")
+        segments = np.concatenate(
+            [np.arange(f, l) for f, l in zip(first, last)] or [[]]
+        ).astype(np.int64)
+        segment_terms = np.repeat(np.arange(len(terms)), last - first)
+        lengths = self.segments[segments + 1] - self.segments[segments]
+        contributions = weights[segment_terms] * \
+            self.impacts[self.segments[segments]]
+        order = np.argsort(-contributions, kind="stable")
+        order = order[contributions[order] > 0]
+        if budget is not None:
+            # a segment is processed if the budget is not used up before it
+            before = np.cumsum(lengths[order]) - lengths[order]
+            order = order[:np.searchsorted(before, budget, side="left")]
+        # the impacts of a list decrease, so the processed segments of a term
+        # are a prefix of its list
+        processed = np.bincount(segment_terms[order], weights=lengths[order],
+                                minlength=len(terms)).astype(np.int64)
+        scores = self.buffer
+        touched = []
+        for start, end, weight in zip(self.offsets[terms],
+                                      self.offsets[terms] + processed,
+                                      weights):
+            # the documents of one term are distinct, so fancy indexing adds
+            # every value, documents without a score yet are new
+            docs = self.docs[start:end]
+            touched.append(docs[scores[docs] == 0] if touched else docs)
+            scores[docs] += weight * self.impacts[start:end]
+        touched = np.concatenate(touched or [[]]).astype(np.int64)
+        result = scores[touched]
+        scores[touched] = 0
+        return touched, result
+
+
+def recall(exact, approximate):
+    """
+    fraction of the exact top documents which are also in the approximate
+    top documents
+    """
+    if not exact:
+        return 1.0
+    found = set(d for d, _ in approximate)
+    return sum(1 for d, _ in exact if d in found) / float(len(exact))
+
+
+def evaluate(index, queries, k=100, budgets=(None,)):
+    """
+    recall@k (against exhaustive scoring with the same scorer) and mean
+    seconds per query for every budget
+    queries: list of term id -> count dicts
+    returns a list of (budget, recall, seconds)
+    """
+    scorer = index.scorer
+    exact = [scoring.top(scorer.accumulate(scorer.query_weights(query)), k)
+             for query in queries]
+    results = []
+    for budget in budgets:
+        recalls = []
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            docs, scores = index.score(query, budget)
+            found = scoring.top(scores, k, docs=docs)
+            recalls.append(recall(expected, found))
+        seconds = (time.perf_counter() - start) / max(len(queries), 1)
+        results.append((budget, float(np.mean(recalls)) if recalls else 1.0,
+                        seconds))
+    return results
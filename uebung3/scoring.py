@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+from collections import namedtuple
+import numpy as np
+
+# Term at a time scoring over postings stored as arrays.
+# A scorer computes a weight for every posting once at index time, so a
+# query only adds up slices of that array. The largest weight of every term
+# is its score upper bound, which lets dynamic pruning skip terms and
+# documents that can not reach the top k, for every scorer the same way.
+
+# the postings of term t are docs[offsets[t]:offsets[t + 1]] (sorted) with
+# the term frequencies tfs[...], lengths is the number of tokens per document
+Postings = namedtuple("Postings", ["offsets", "docs", "tfs", "lengths"])
+
+
+def build_postings(corpus, mapping=None, term_count=None):
+    """
+    Postings of a corpus_cache.Corpus, the term ids are the ids of the corpus
+    or mapping[id of the corpus] (e.g. the ids of a larger lexicon with
+    term_count terms)
+    """
+    fields = max(corpus.fields, 1)
+    document_offsets = np.asarray(corpus.offsets, dtype=np.int64)[::fields]
+    lengths = np.diff(document_offsets).astype(np.int32)
+    count = len(lengths)
+    terms = np.frombuffer(corpus.ids, dtype=np.int32).astype(np.int64)
+    if mapping is not None:
+        terms = np.asarray(mapping, dtype=np.int64)[terms]
+    if term_count is None:
+        term_count = len(corpus.terms)
+    docs = np.repeat(np.arange(count, dtype=np.int64), lengths)
+    # one key per (term, document), sorted by term and then document
+    keys, tfs = np.unique(terms * count + docs, return_counts=True)
+    terms = keys // max(count, 1)
+    offsets = np.zeros(term_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=term_count), out=offsets[1:])
+    return Postings(offsets, (keys % max(count, 1)).astype(np.int32),
+                    tfs.astype(np.int32), lengths)
+
+
+class Scorer:
+    """
+    score(d) = finish(sum over query terms t of query_weight(t) * weight(t, d))
+    subclasses implement document_weights() and can change query_weights()
+    and finish()
+    """
+    name = ""
+
+    def fit(self, postings, df=None, documents=None, average_length=None):
+        """
+        precompute the weight of every posting and the upper bound per term
+        df (per term id), documents and average_length are the collection
+        statistics, by default those of the postings (a shard passes the
+        statistics of all shards, so its scores equal the unsharded ones)
+        """
+        self.postings = postings
+        self.count = len(postings.lengths)
+        # length of the postings lists
+        self.sizes = np.diff(postings.offsets)
+        self.df = self.sizes if df is None else np.asarray(df)
+        self.documents = self.count if documents is None else documents
+        if average_length is None:
+            average_length = float(postings.lengths.mean()) \
+                if self.count else 0.0
+        self.average_length = average_length
+        self.term_of_posting = np.repeat(
+            np.arange(len(self.sizes), dtype=np.int64), self.sizes)
+        self.weights = self.document_weights().astype(np.float64)
+        self.bounds = np.zeros(len(self.sizes), dtype=np.float64)
+        found = self.sizes > 0
+        self.bounds[found] = np.maximum.reduceat(
+            self.weights, self.postings.offsets[:-1][found])
+        return self
+
+    def document_weights(self):
+        raise NotImplementedError
+
+    def query_weights(self, counts):
+        """
+        term id -> weight for the term id -> count of a query
+        """
+        return {term: float(count) for term, count in counts.items()}
+
+    def upper_bounds(self, query):
+        """
+        term id -> largest contribution of the term to any score
+        """
+        return {term: weight * self.bounds[term]
+                for term, weight in query.items()}
+
+    def term(self, term):
+        """
+        documents and weights of a term
+        """
+        start = self.postings.offsets[term]
+        end = self.postings.offsets[term + 1]
+        return self.postings.docs[start:end], self.weights[start:end]
+
+    def accumulate(self, query):
+        """
+        dense array of the summed contributions of all query terms
+        """
+        scores = np.zeros(self.count, dtype=np.float64)
+        for term, weight in query.items():
+            docs, weights = self.term(term)
+            scores[docs] += weight * weights
+        return scores
+
+    def finish(self, scores, query):
+        return scores
+
+    def score(self, counts):
+        """
+        score of every document for the term id -> count of a query
+        """
+        query = self.query_weights(counts)
+        return self.finish(self.accumulate(query), query)
+
+
+class TfIdfCosine(Scorer):
+    """
+    length normalized tf * (1 + log10(N / df)), cosine similarity of the
+    query and the document restricted to the query terms
+    """
+    name = "tfidf"
+
+    def document_weights(self):
+        self.idf = np.ones(len(self.df))
+        found = self.df > 0
+        self.idf[found] += np.log10(self.documents / self.df[found])
+        lengths = self.postings.lengths[self.postings.docs]
+        return self.postings.tfs / np.maximum(lengths, 1) * \
+            self.idf[self.term_of_posting]
+
+    def query_weights(self, counts):
+        total = float(sum(counts.values()))
+        return {term: count / total * self.idf[term]
+                for term, count in counts.items()}
+
+    def upper_bounds(self, query):
+        # by Cauchy-Schwarz a term adds at most its share of the query norm
+        norm = np.sqrt(sum(weight ** 2 for weight in query.values()))
+        return {term: weight / norm if norm else 0.0
+                for term, weight in query.items()}
+
+    def accumulate(self, query):
+        self.squares = np.zeros(self.count, dtype=np.float64)
+        for term in query:
+            docs, weights = self.term(term)
+            self.squares[docs] += weights ** 2
+        return Scorer.accumulate(self, query)
+
+    def finish(self, scores, query):
+        norm = np.sqrt(sum(weight ** 2 for weight in query.values()))
+        magnitude = norm * np.sqrt(self.squares)
+        found = magnitude > 0
+        scores[found] /= magnitude[found]
+        scores[~found] = 0.0
+        return scores
+
+
+class BM25(Scorer):
+    """
+    Okapi BM25 with the non negative idf log(1 + (N - df + 0.5) / (df + 0.5))
+    """
+    name = "bm25"
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+    def idf(self):
+        return np.log(1.0 + (self.documents - self.df + 0.5) /
+                      (self.df + 0.5))
+
+    def document_weights(self):
+        tfs = self.postings.tfs.astype(np.float64)
+        lengths = self.postings.lengths[self.postings.docs]
+        norm = self.k1 * (1.0 - self.b + self.b * lengths /
+                          max(self.average_length, 1e-12))
+        return self.idf()[self.term_of_posting] * \
+            tfs * (self.k1 + 1.0) / (tfs + norm)
+
+
+class BM25Plus(BM25):
+    """
+    BM25+ (Lv and Zhai), adds delta * idf for every matching term so long
+    documents are not scored below documents without the term
+    """
+    name = "bm25+"
+
+    def __init__(self, k1=1.2, b=0.75, delta=1.0):
+        BM25.__init__(self, k1, b)
+        self.delta = delta
+
+    def document_weights(self):
+        return BM25.document_weights(self) + \
+            self.delta * self.idf()[self.term_of_posting]
+
+
+scorers = {scorer.name: scorer for scorer in [TfIdfCosine, BM25, BM25Plus]}
+
+
+def top(scores, k=100, selected=None, docs=None):
+    """
+    (document, score) of the k best documents with a score above 0, best
+    first, equal scores by document, selected is an optional boolean mask
+    docs: the documents of the scores, if not every document has a score
+    (e.g. impact.ImpactIndex.score), in any order
+    """
+    if docs is None:
+        if selected is not None:
+            scores = np.where(selected, scores, 0.0)
+        docs = np.flatnonzero(scores > 0)
+        scores = scores[docs]
+    else:
+        keep = scores > 0
+        if selected is not None:
+            keep &= selected[docs]
+        docs = docs[keep]
+        scores = scores[keep]
+    if len(docs) > k:
+        # the k-th best score, everything above it and the ties with it
+        # which have the smallest documents
+        threshold = np.partition(scores, len(docs) - k)[len(docs) - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)
+        needed = k - len(above)
+        if len(ties) > needed:
+            ties = ties[np.argpartition(docs[ties], needed - 1)[:needed]]
+        chosen = np.concatenate((above, ties))
+        docs = docs[chosen]
+        scores = scores[chosen]
+    order = np.lexsort((docs, -scores))
+    return [(int(docs[i]), float(scores[i])) for i in order]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+from multiprocessing import Pipe, Process
+import io
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+import corpus_cache  # noqa: E402
+from lexicon import FrontCodedLexicon, Lexicon  # noqa: E402
+from metadata import Metadata, parse_filters  # noqa: E402
+import metrics  # noqa: E402
+import scoring  # noqa: E402
+import tf_idf  # noqa: E402
+
+# The tweet file split into document ranges (shards), every shard is indexed
+# and served by its own worker process, so no process has to hold the whole
+# index and queries run on all cores.
+#
+# Building takes two rounds: every worker tokenizes its range and reports its
+# terms, document frequencies and lengths. The coordinator merges them into
+# one lexicon and the collection statistics and sends them back, so every
+# worker uses the global term ids, idf and average length and the merged
+# results are the same as those of one index over the whole file.
+#
+# messages to a worker (over a multiprocessing pipe):
+#   ("boolean", [[term ids], ...]) -> sorted docIDs which contain at least
+#       one term of every group
+#   ("ranked", {term id: count}, k, filters) -> best k (docID, score)
+#   ("close",)
+
+
+def shard_ranges(filename, shards):
+    """
+    (start byte, end byte, first docID) of every shard, the shards are
+    about equally large and start at line beginnings
+    """
+    size = os.path.getsize(filename)
+    starts = [0]
+    with open(filename, "rb") as file:
+        for shard in range(1, shards):
+            position = max(size * shard // shards, starts[-1])
+            if position > 0:
+                # move to the beginning of the next line
+                file.seek(position - 1)
+                file.readline()
+                position = file.tell()
+            starts.append(min(position, size))
+        starts.append(size)
+        # the first docID of a shard is the number of lines before it
+        firsts = [0]
+        file.seek(0)
+        for start, end in zip(starts[:-2], starts[1:-1]):
+            lines = 0
+            remaining = end - start
+            while remaining > 0:
+                block = file.read(min(remaining, 1 << 20))
+                lines += block.count(b"\n")
+                remaining -= len(block)
+            firsts.append(firsts[-1] + lines)
+    return list(zip(starts[:-1], starts[1:], firsts))
+
+
+def serve(connection, filename, start, end, first_doc):
+    """
+    worker process: indexes the lines between the start and end byte and
+    answers queries with global docIDs
+    """
+    with open(filename, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    lines = io.StringIO(data.decode("utf-8"), newline=None)
+    corpus = corpus_cache.encode(lines, tf_idf.tokenize)
+    del data, lines
+    local = scoring.build_postings(corpus)
+    # round one: report the local statistics
+    connection.send((corpus.terms, np.diff(local.offsets), len(local.lengths),
+                     int(local.lengths.sum())))
+    del local
+    # round two: global term ids and statistics
+    mapping, term_count, scorer_name, df, documents, average_length = \
+        connection.recv()
+    postings = scoring.build_postings(corpus, mapping, term_count)
+    metadata = Metadata(corpus.labels, postings.lengths)
+    del corpus
+    scorer = scoring.scorers[scorer_name]().fit(
+        postings, df, documents, average_length)
+    connection.send(len(postings.lengths))
+    while True:
+        message = connection.recv()
+        if message[0] == "close":
+            break
+        connection.send(answer(scorer, metadata, message, first_doc))
+    connection.close()
+
+
+def answer(scorer, metadata, message, first_doc=0):
+    """
+    result of a "boolean" or "ranked" message for a fitted scorer and the
+    metadata of its documents, the docIDs start at first_doc
+    """
+    if message[0] == "boolean":
+        result = None
+        for group in message[1]:
+            docs = np.unique(np.concatenate(
+                [scorer.term(term)[0] for term in group] or [[]]))
+            result = docs if result is None else \
+                np.intersect1d(result, docs, assume_unique=True)
+        if result is None:
+            result = []
+        return [int(d) + first_doc for d in result]
+    counts, k, filters = message[1:]
+    selected = metadata.select(**filters) if filters else None
+    return [(d + first_doc, score) for d, score
+            in scoring.top(scorer.score(counts), k, selected)]
+
+
+class ShardedIndex:
+    """
+    coordinator of one worker process per shard of a tweet file
+    """
+    def __init__(self, filename, shards=None, scorer="tfidf"):
+        self.filename = filename
+        self.connections = []
+        self.workers = []
+        for start, end, first_doc in shard_ranges(
+                filename, shards or os.cpu_count() or 1):
+            connection, worker_connection = Pipe()
+            worker = Process(target=serve, daemon=True, args=(
+                worker_connection, filename, start, end, first_doc))
+            worker.start()
+            # only the worker keeps its end open, so recv() fails with an
+            # EOFError instead of blocking forever if the worker dies
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+        # round one: merge the terms and statistics of all shards
+        self.lexicon = Lexicon()
+        mappings = []
+        statistics = self.gather()
+        with metrics.timer("shards.merge"):
+            for terms, df, count, length in statistics:
+                mappings.append(self.lexicon.encode(terms, add=True))
+            df = np.zeros(len(self.lexicon), dtype=np.int64)
+            for mapping, (terms, shard_df, count, length) in zip(mappings,
+                                                                 statistics):
+                df[mapping] += shard_df
+        documents = sum(count for _, _, count, _ in statistics)
+        average_length = sum(length for _, _, _, length in statistics) / \
+            float(max(documents, 1))
+        # round two: global term ids and statistics for every shard
+        for connection, mapping in zip(self.connections, mappings):
+            connection.send((mapping, len(self.lexicon), scorer, df,
+                             documents, average_length))
+        self.documents = sum(self.gather())
+        self.term_dictionary = FrontCodedLexicon.from_lexicon(self.lexicon)
+
+    def gather(self):
+        """
+        the replies of all workers, in shard order
+        """
+        return [connection.recv() for connection in self.connections]
+
+    def scatter(self, message):
+        for connection in self.connections:
+            connection.send(message)
+        return self.gather()
+
+    def boolean(self, terms):
+        """
+        sorted docIDs of the tweets containing all terms (wildcard terms:
+        any matching term)
+        """
+        groups = []
+        for term in terms:
+            term = tf_idf.normalize_pattern(term)
+            group = [term_id for _, term_id
+                     in self.term_dictionary.wildcard(term)]
+            if not group:
+                return []
+            groups.append(group)
+        with metrics.latency("shards.boolean"):
+            results = self.scatter(("boolean", groups))
+        # the shards are document ranges in order, so are their results
+        return [d for result in results for d in result]
+
+    def ranked(self, search, k=100):
+        """
+        best k (docID, score) for a query string, which can contain
+        since:, until: and from: filters
+        """
+        search, filters = parse_filters(search.split())
+        counts = tf_idf.query_counts(search, self.lexicon,
+                                     self.term_dictionary)
+        if not counts:
+            return []
+        with metrics.latency("shards.ranked"):
+            results = [result for shard in self.scatter(
+                ("ranked", dict(counts), k, filters)) for result in shard]
+            return sorted(results,
+                          key=lambda result: (-result[1], result[0]))[:k]
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(("close",))
+        for worker in self.workers:
+            worker.join()
+        self.connections = []
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(filename="tweets", shards=None, scorer="tfidf"):
+    with ShardedIndex(filename, shards and int(shards), scorer) as index:
+        try:
+            while True:
+                search = input('What are you looking for?: ')
+                if search.strip() == ":stats":
+                    print(metrics.dump())
+                    continue
+                results = index.ranked(search)
+                print(tf_idf.getLines(filename, [d for d, _ in results],
+                                      [score for _, score in results]))
+        except (KeyboardInterrupt, EOFError):
+            pass
+
+
+if __name__ == '__main__':
+    # shards.py [tweet file] [number of shards] [tfidf|bm25|bm25+]
+    main(*sys.argv[1:4])
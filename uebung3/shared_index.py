@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+from multiprocessing import Pool, shared_memory
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+from lexicon import FrontCodedLexicon, Lexicon  # noqa: E402
+from metadata import Metadata, parse_filters  # noqa: E402
+import metrics  # noqa: E402
+import scoring  # noqa: E402
+import shards  # noqa: E402
+import tf_idf  # noqa: E402
+
+# Read only index in one shared memory segment, served by a pool of query
+# worker processes. The arrays of the fitted scorer (postings, weights,
+# bounds...) and of the metadata are copied into the segment once, every
+# worker attaches to it and only creates array views, so all processes
+# together need about the memory of one index. Queries are parsed in the
+# coordinator (it has the lexicon) and answered by the workers in parallel.
+
+# array attributes of a scorer which are only needed while fitting
+fit_only = {"term_of_posting", "squares"}
+
+
+def share(arrays):
+    """
+    copy arrays (name -> array) into a new shared memory segment, returns the
+    segment and the layout name -> (offset, dtype, shape)
+    """
+    layout = {}
+    size = 0
+    for name, array in arrays.items():
+        # every array starts at a multiple of 64 bytes
+        size = (size + 63) // 64 * 64
+        layout[name] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    views = attach(segment, layout, writeable=True)
+    for name, array in arrays.items():
+        views[name][...] = array
+    return segment, layout
+
+
+def attach(segment, layout, writeable=False):
+    """
+    array views (name -> array) of a shared memory segment
+    """
+    views = {}
+    for name, (offset, dtype, shape) in layout.items():
+        view = np.ndarray(shape, dtype=dtype, buffer=segment.buf,
+                          offset=offset)
+        view.flags.writeable = writeable
+        views[name] = view
+    return views
+
+
+def scorer_state(scorer, metadata):
+    """
+    arrays and other attributes of a fitted scorer and of the metadata
+    """
+    arrays = {"postings." + name: np.asarray(value)
+              for name, value in scorer.postings._asdict().items()}
+    attributes = {}
+    for name, value in vars(scorer).items():
+        if name in fit_only or name == "postings":
+            continue
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+        else:
+            attributes[name] = value
+    for name in ("tweet_ids", "timestamps", "user_ids", "lengths"):
+        arrays["metadata." + name] = getattr(metadata, name)
+    attributes["metadata.users"] = metadata.users.terms
+    attributes["metadata.average_length"] = metadata.average_length
+    return arrays, attributes
+
+
+def restore(scorer_name, views, attributes):
+    """
+    scorer and metadata from array views and the other attributes
+    """
+    scorer = scoring.scorers[scorer_name].__new__(
+        scoring.scorers[scorer_name])
+    metadata = Metadata()
+    for name, value in list(views.items()) + list(attributes.items()):
+        if name.startswith("metadata."):
+            setattr(metadata, name[len("metadata."):], value)
+        elif not name.startswith("postings."):
+            setattr(scorer, name, value)
+    metadata.users = Lexicon(metadata.users)
+    scorer.postings = scoring.Postings(**{
+        name: views["postings." + name] for name in scoring.Postings._fields})
+    return scorer, metadata
+
+
+# state of a pool worker
+worker = {}
+
+
+def start_worker(segment_name, layout, scorer_name, attributes):
+    segment = shared_memory.SharedMemory(name=segment_name)
+    worker["segment"] = segment
+    worker["scorer"], worker["metadata"] = restore(
+        scorer_name, attach(segment, layout), attributes)
+
+
+def work(message):
+    return shards.answer(worker["scorer"], worker["metadata"], message)
+
+
+class SharedIndex:
+    """
+    index of a tweet file in shared memory with a pool of query workers
+    """
+    def __init__(self, filename, processes=None, scorer="tfidf"):
+        self.filename = filename
+        corpus = tf_idf.load(filename)
+        self.lexicon = Lexicon(corpus.terms)
+        self.term_dictionary = FrontCodedLexicon.from_lexicon(self.lexicon)
+        postings = scoring.build_postings(corpus)
+        metadata = Metadata(corpus.labels, postings.lengths)
+        del corpus
+        arrays, attributes = scorer_state(
+            scoring.scorers[scorer]().fit(postings), metadata)
+        self.segment, layout = share(arrays)
+        del postings, metadata, arrays
+        # the coordinator uses the shared copy as well
+        self.scorer, self.metadata = restore(
+            scorer, attach(self.segment, layout), attributes)
+        self.pool = Pool(processes, start_worker,
+                         (self.segment.name, layout, scorer, attributes))
+
+    def parse(self, search, k=100):
+        """
+        "ranked" message for a query string, None if no term is known
+        """
+        search, filters = parse_filters(search.split())
+        counts = tf_idf.query_counts(search, self.lexicon,
+                                     self.term_dictionary)
+        if not counts:
+            return None
+        return ("ranked", dict(counts), k, filters)
+
+    def ranked(self, searches, k=100):
+        """
+        best k (docID, score) of every query string, answered in parallel
+        """
+        messages = [self.parse(search, k) for search in searches]
+        metrics.count("shared.queries", len(messages))
+        with metrics.latency("shared.ranked"):
+            results = self.pool.map(work, [m for m in messages if m],
+                                    chunksize=1)
+        results = iter(results)
+        return [next(results) if message else [] for message in messages]
+
+    def boolean(self, queries):
+        """
+        sorted docIDs of every query (a list of terms which all have to be
+        in a tweet, wildcard terms: any matching term), in parallel
+        """
+        messages = []
+        for terms in queries:
+            groups = [[term_id for _, term_id in self.term_dictionary.wildcard(
+                           tf_idf.normalize_pattern(term))]
+                      for term in terms]
+            messages.append(("boolean", groups)
+                            if groups and all(groups) else None)
+        metrics.count("shared.queries", len(messages))
+        with metrics.latency("shared.boolean"):
+            results = iter(self.pool.map(work, [m for m in messages if m],
+                                         chunksize=1))
+        return [next(results) if message else [] for message in messages]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.scorer = self.metadata = None
+        self.segment.close()
+        self.segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(filename="tweets", processes=None, scorer="tfidf"):
+    """
+    answers the queries of stdin (one per line) in parallel, prints the best
+    docIDs and scores of each
+    """
+    with SharedIndex(filename, processes and int(processes), scorer) as index:
+        searches = [line.strip() for line in sys.stdin if line.strip()]
+        for search, results in zip(searches, index.ranked(searches)):
+            print(search)
+            for d, score in results:
+                print("\t" + str(d) + "\t" + str(score))
+
+
+if __name__ == '__main__':
+    # shared_index.py [tweet file] [number of processes] [tfidf|bm25|bm25+]
+    main(*sys.argv[1:4])
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import impact
+import scoring
+
+
+def random_postings(documents=200, terms=30, seed=0):
+    """
+    Postings of a random term frequency matrix
+    """
+    rng = np.random.RandomState(seed)
+    tfs = rng.poisson(0.3, size=(terms, documents))
+    docs, frequencies = [], []
+    for row in tfs:
+        found = np.flatnonzero(row)
+        docs.append(found)
+        frequencies.append(row[found])
+    offsets = np.zeros(terms + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in docs], out=offsets[1:])
+    return scoring.Postings(offsets, np.concatenate(docs).astype(np.int32),
+                            np.concatenate(frequencies).astype(np.int32),
+                            np.maximum(tfs.sum(axis=0), 1).astype(np.int32))
+
+
+@pytest.fixture
+def scorer():
+    return scoring.BM25().fit(random_postings())
+
+
+def test_quantization(scorer):
+    index = impact.ImpactIndex(scorer)
+    assert index.impacts.dtype == np.uint8
+    assert len(index) == len(scorer.weights)
+    for term in range(len(scorer.sizes)):
+        start, end = index.offsets[term], index.offsets[term + 1]
+        impacts = index.impacts[start:end].astype(np.float64)
+        # relative to the largest weight of the term
+        assert impacts[0] == 255
+        assert np.all(impacts >= 1)
+        assert np.all(np.diff(impacts) <= 0)
+        docs, weights = scorer.term(term)
+        exact = dict(zip(docs, weights))
+        for doc, value in zip(index.docs[start:end], impacts):
+            assert abs(value * index.scales[term] - exact[doc]) <= \
+                index.scales[term] / 2 + 1e-12
+
+
+def test_scores_without_budget(scorer):
+    index = impact.ImpactIndex(scorer, bits=16)
+    query = {0: 1, 3: 2, 7: 1}
+    docs, scores = index.score(query)
+    assert len(np.unique(docs)) == len(docs)
+    exact = scorer.score(query)
+    assert set(docs) == set(np.flatnonzero(exact > 0))
+    np.testing.assert_allclose(scores, exact[docs], rtol=1e-3)
+    # the buffer is reset for the next query
+    assert not index.buffer.any()
+
+
+def test_budget_and_pruning(scorer):
+    query = {1: 1, 2: 1}
+    index = impact.ImpactIndex(scorer)
+    docs, _ = index.score(query, budget=10)
+    assert 0 < len(docs) < np.count_nonzero(scorer.score(query))
+    pruned = impact.ImpactIndex(scorer, keep=0.5)
+    assert len(pruned) == np.sum(np.maximum(np.ceil(scorer.sizes * 0.5), 1))
+    exact = scoring.top(scorer.score(query), 5)
+    docs, scores = index.score(query)
+    approximate = scoring.top(scores, 5, docs=docs)
+    assert impact.recall(exact, approximate) == 1.0
+    assert impact.recall([], approximate) == 1.0
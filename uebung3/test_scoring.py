@@ -0,0 +1,62 @@
+import math
+
+import numpy as np
+import pytest
+
+import scoring
+
+# doc 0: term 0 twice and term 1 (3 tokens), doc 1: term 1 (1 token)
+postings = scoring.Postings(offsets=np.array([0, 1, 3]),
+                            docs=np.array([0, 0, 1], dtype=np.int32),
+                            tfs=np.array([2, 1, 1], dtype=np.int32),
+                            lengths=np.array([3, 1], dtype=np.int32))
+
+
+def bm25(tf, length, df, k1=1.2, b=0.75, documents=2, average_length=2.0):
+    idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * length / average_length)
+    return idf * tf * (k1 + 1) / (tf + norm), idf
+
+
+def test_bm25():
+    scorer = scoring.BM25().fit(postings)
+    assert scorer.average_length == 2.0
+    # idf(term 0) = log(1 + 1.5 / 1.5) = log(2)
+    assert scorer.score({0: 1})[0] == pytest.approx(
+        math.log(2) * 2 * 2.2 / (2 + 1.2 * (0.25 + 0.75 * 3 / 2)))
+    scores = scorer.score({0: 1, 1: 1})
+    assert scores[0] == pytest.approx(bm25(2, 3, 1)[0] + bm25(1, 3, 2)[0])
+    assert scores[1] == pytest.approx(bm25(1, 1, 2)[0])
+    np.testing.assert_allclose(scorer.bounds,
+                               [bm25(2, 3, 1)[0], bm25(1, 1, 2)[0]])
+
+
+def test_bm25_plus():
+    scorer = scoring.BM25Plus(delta=1.0).fit(postings)
+    scores = scorer.score({0: 1, 1: 1})
+    for doc, terms in [(0, [(2, 3, 1), (1, 3, 2)]), (1, [(1, 1, 2)])]:
+        expected = 0.0
+        for tf, length, df in terms:
+            weight, idf = bm25(tf, length, df)
+            expected += weight + idf
+        assert scores[doc] == pytest.approx(expected)
+
+
+def test_collection_statistics():
+    # a shard scores with the statistics of the whole collection
+    scorer = scoring.BM25().fit(postings, df=np.array([1, 2]), documents=4,
+                                average_length=3.0)
+    assert scorer.score({1: 1})[1] == pytest.approx(
+        bm25(1, 1, 2, documents=4, average_length=3.0)[0])
+
+
+def test_top():
+    scores = np.array([0.5, 0.0, 2.0, 0.5, 1.0, 0.5])
+    assert scoring.top(scores, 3) == [(2, 2.0), (4, 1.0), (0, 0.5)]
+    assert scoring.top(scores, 10) == \
+        [(2, 2.0), (4, 1.0), (0, 0.5), (3, 0.5), (5, 0.5)]
+    selected = np.array([False, True, False, True, True, True])
+    assert scoring.top(scores, 2, selected) == [(4, 1.0), (3, 0.5)]
+    docs = np.array([5, 3, 0])
+    assert scoring.top(np.array([0.5, 0.5, 0.25]), 1, docs=docs) == \
+        [(3, 0.5)]
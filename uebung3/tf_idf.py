@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 from collections import defaultdict
-import math
+import os
 import sys
-
-
-occurences = []
-tfidf_documents = []
-all_terms = set()
-all_occurences = defaultdict(set)
-idf = defaultdict()
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+import corpus_cache  # noqa: E402
+from lexicon import FrontCodedLexicon, Lexicon  # noqa: E402
+from metadata import Metadata, parse_filters, tweet_labels  # noqa: E402
+import metrics  # noqa: E402
+import scoring  # noqa: E402
+import impact  # noqa: E402
+
+
+# terms are only stored in the lexicon, everything else uses their term id
+lexicon = Lexicon()
+# sorted, front coded copy of the lexicon for wildcard queries like "stutt*"
+term_dictionary = FrontCodedLexicon([])
+# per document: tweet id, timestamp, user and length
+metadata = Metadata()
+# postings with term frequencies as arrays, for the scorers
+postings = None
 
 stop_words = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from',
               'has', 'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the',
@@ -32,82 +45,58 @@ def normalize(term):
         replace("\"", "")
 
 
-def normalize_line(occurence):
-    all = sum(occurence.values())
-    for term in occurence:
-        occurence[term] = occurence[term] / all
-    return occurence
+def normalize_pattern(term):
+    """
+    normalize a query term but keep the wildcard characters * and ?
+    """
+    return "*".join("?".join(normalize(part) for part in piece.split("?"))
+                    for piece in term.split("*"))
 
 
-def index(filename):
+def tokenize(line):
+    """
+    normalized terms of a tweet (without the first four columns), only
+    alphabetic ones and no stop words, the metadata columns are the labels
+    """
+    terms = []
+    tweet = line.split()
+    for term in tweet[4:]:
+        # remove clutter
+        term = normalize(term)
+        # check if term is in stop words to save some memory
+        if (not str.isalpha(term) or (term in stop_words)):
+            continue
+        terms.append(term)
+    return tweet_labels(line), [terms]
+
+
+def load(filename):
+    """
+    tokenized file, from the corpus cache if it was tokenized before
+    """
     try:
-        current_id = 0
-        # open file
-        with open(filename, "r") as file:
-            # iterate over each line in file
-            for line in file:
-                tweet = line.split()
-
-                occurence = defaultdict()
-
-                for term in tweet[4:]:
-                    # remove clutter
-                    term = normalize(term)
-                    # check if term is in stop words to save some memory
-                    if (not str.isalpha(term) or (term in stop_words)):
-                        continue
-                    if term in occurence:
-                        occurence[term] += 1
-                    else:
-                        occurence[term] = 1
-                    all_occurences[term].add(current_id)
-                    all_terms.add(term)
-                occurence = normalize_line(occurence)
-                occurences.append(occurence)
-
-                current_id += 1
-                # this is for displaying a progress while indexing
-                if current_id % 10000 == 0:
-                    sys.stdout.write("\r{0} %".format(
-                        int(current_id / 10000.0)))
-                    sys.stdout.flush()
-                # if current_id >= 100000:
-                #     break
+        return corpus_cache.load(
+            filename, tokenize, ("uebung3/tf_idf.py", 2, sorted(stop_words)))
     except FileNotFoundError as e:
         raise SystemExit("Could not open file: " + str(e))
-    return
-
-
-def inverseDocumentFrequency():
-    len_all_terms = len(occurences)
-    for line in occurences:
-        for term in line:
-            occ_in_all = len(all_occurences[term])
-            if occ_in_all > 0:
-                idf[term] = 1.0 + \
-                    math.log(float(len_all_terms) / occ_in_all, 10)
-            else:
-                idf[term] = 1.0
-
-
-def tfidf():
-    for line in occurences:
-        doc_tfidf = defaultdict()
-        for term, tf in line.items():
-            doc_tfidf[term] = tf * idf[term]
-        tfidf_documents.append(doc_tfidf)
 
 
-def cosine_similarity(vector1, vector2):
-    """
-    return the similarity of two vectors
-    """
-    dot_product = sum(p * q for p, q in zip(vector1, vector2))
-    magnitude = math.sqrt(sum([val**2 for val in vector1])) * \
-        math.sqrt(sum([val**2 for val in vector2]))
-    if not magnitude:
-        return 0
-    return dot_product / magnitude
+def index(filename):
+    global lexicon
+    global term_dictionary
+    global metadata
+    global postings
+    corpus = load(filename)
+    # the corpus already numbered its terms, the lexicon takes them over
+    lexicon = Lexicon(corpus.terms)
+    metadata = Metadata(corpus.labels, np.diff(corpus.offsets))
+    with metrics.timer("index.build_postings"):
+        postings = scoring.build_postings(corpus)
+    metrics.count("index.documents", len(postings.lengths))
+    metrics.count("index.terms", len(lexicon))
+    metrics.count("index.postings", len(postings.docs))
+    term_dictionary = FrontCodedLexicon.from_lexicon(lexicon)
+    return
 
 
 def getLines(filename, lines, sim):
@@ -132,59 +121,81 @@ def getLines(filename, lines, sim):
     return result
 
 
-def main():
+def query_counts(search, lexicon, term_dictionary):
+    """
+    term id -> count of the query terms which are in the lexicon
+    """
+    occurence = defaultdict()
+    for term in search:
+        # a wildcard term counts once for every matching term, normalize
+        # would remove the ?
+        if "*" in term or "?" in term:
+            term_ids = [term_id for _, term_id
+                        in term_dictionary.wildcard(normalize_pattern(term))]
+        else:
+            # remove clutter
+            term = normalize(term)
+            # check if term is in stop words to save some memory
+            if not str.isalpha(term) or (term in stop_words):
+                continue
+            term_ids = [lexicon.get(term)]
+        for term in term_ids:
+            if term is None:
+                continue
+            if term in occurence:
+                occurence[term] += 1
+            else:
+                occurence[term] = 1
+    return occurence
+
+
+def main(scorer_name="tfidf", keep=None, budget=None):
+    """
+    scorer_name: tfidf (cosine), bm25 or bm25+
+    keep: if given, queries use impact ordered postings of which this
+    fraction per term is kept, budget: number of postings processed per query
+    """
     filename = "tweets"
     index(filename)
-    inverseDocumentFrequency()
-    tfidf()
+    scorer = scoring.scorers[scorer_name]().fit(postings)
+    impact_index = None
+    if keep is not None:
+        impact_index = impact.ImpactIndex(scorer, keep=float(keep))
+        budget = None if budget is None else int(budget)
     try:
         # asking for more querys
         while True:
             # ask for input
-            tfidf_comparisons = []
             search = input('What are you looking for?: ')
-            search = search.split()
-
-            occurence = defaultdict()
-            for term in search:
-                # remove clutter
-                term = normalize(term)
-                # check if term is in stop words to save some memory
-                if not str.isalpha(term) or (term in stop_words):
-                    continue
-                if term not in all_terms:
-                    continue
-                if term in occurence:
-                    occurence[term] += 1
-                else:
-                    occurence[term] = 1
-            occurence = normalize_line(occurence)
+            # :stats prints the metrics of this process as JSON
+            if search.strip() == ":stats":
+                print(metrics.dump())
+                continue
+            # since:2016-08-20, until:2016-08-21 and from:@user filter
+            search, filters = parse_filters(search.split())
+            selected = metadata.select(**filters) if filters else None
+
+            occurence = query_counts(search, lexicon, term_dictionary)
             if len(occurence) == 0:
                 continue
 
-            vector = []
-            for term, tf in occurence.items():
-                vector.append(tf * idf[term])
-
-            for count, doc in enumerate(tfidf_documents):
-                make_vector = [0.0] * len(occurence)
-                i = 0
-                for key, value in occurence.items():
-                    if key in doc:
-                        make_vector[i] = doc[key]
-                    i += 1
-                similarity = cosine_similarity(vector, make_vector)
-                if similarity > 0:
-                    tfidf_comparisons.append((similarity, count))
             lines = []
             sim = []
-            for x in sorted(tfidf_comparisons, key=lambda y: float(y[0]), reverse=True)[:100]:
-                sim.append(x[0])
-                lines.append(x[1])
+            with metrics.latency("query.ranked" if impact_index is None
+                                 else "query.impact"):
+                if impact_index is None:
+                    scores, docs = scorer.score(occurence), None
+                else:
+                    docs, scores = impact_index.score(occurence, budget)
+                for line, similarity in scoring.top(scores, 100, selected,
+                                                    docs):
+                    sim.append(similarity)
+                    lines.append(line)
             print(getLines(filename, lines, sim))
     except KeyboardInterrupt:
         pass
 
 
 if __name__ == '__main__':
-    main()
+    # tf_idf.py [tfidf|bm25|bm25+] [kept fraction] [postings budget]
+    main(*sys.argv[1:4])
@@ -1,78 +1,29 @@
 #!/usr/bin/env python3
-import csv
 import random
 import math
+import numpy as np
 from collections import defaultdict
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+from reviews import load_csv, normalize  # noqa: E402
 
-stop_words = {"aber", "alle", "allem", "allen", "aller", "alles", "als", "also", "am", "an", "ander", "andere",
-              "anderem", "anderen", "anderer", "anderes", "anderm", "andern", "anders", "auch", "auf", "aus", "bei",
-              "bin", "bis", "bist", "da", "damit", "dann", "das", "dass", "dasselbe", "dazu", "daß", "dein", "deine",
-              "deinem", "deinen", "deiner", "deines", "dem", "demselben", "den", "denn", "denselben", "der", "derer",
-              "derselbe", "derselben", "des", "desselben", "dessen", "dich", "die", "dies", "diese", "dieselbe",
-              "dieselben", "diesem", "diesen", "dieser", "dieses", "dir", "doch", "dort", "du", "durch", "ein", "eine",
-              "einem", "einen", "einer", "eines", "einig", "einige", "einigem", "einigen", "einiger", "einiges",
-              "einmal", "er", "es", "etwas", "euch", "euer", "eure", "eurem", "euren", "eurer", "eures", "für", "gegen",
-              "gewesen", "hab", "habe", "haben", "hat", "hatte", "hatten", "hier", "hin", "hinter", "ich", "ihm", "ihn",
-              "ihnen", "ihr", "ihre", "ihrem", "ihren", "ihrer", "ihres", "im", "in", "indem", "ins", "ist",
-              "jede", "jedem", "jeden", "jeder", "jedes", "jene", "jenem", "jenen", "jener", "jenes", "jetzt", "kann",
-              "kein", "keine", "keinem", "keinen", "keiner", "keines", "können", "könnte", "machen", "man", "mal",
-              "manche", "manchem", "manchen", "mancher", "manches", "mein", "meine", "meinem", "meinen", "meiner",
-              "meines", "mich", "mir", "mit", "muss", "musste", "nach", "nicht", "nichts", "noch", "nun", "nur", "ob",
-              "oder", "ohne", "sehr", "sein", "seine", "seinem", "seinen", "seiner", "seines", "selbst", "sich", "sie",
-              "sind", "so", "solche", "solchem", "solchen", "solcher", "solches", "soll", "sollte", "sondern", "sonst",
-              "um", "und", "uns", "unser", "unsere", "unserem", "unseren", "unserer", "unseres", "unter", "viel", "vom",
-              "von", "vor", "war", "waren", "warst", "was", "weg", "weil", "weiter", "welche", "welchem", "welchen",
-              "welcher", "welches", "wenn", "werde", "werden", "wie", "wieder", "will", "wir", "wird", "wirst", "wo",
-              "wollen", "wollte", "während", "würde", "würden", "zu", "zum", "zur", "zwar", "zwischen", "über"}
 init_prob = 0.5
 
 feature_classification = defaultdict()
 amount_good = 0
 amount_bad = 0
-
-
-def load_csv(filename):
-    data = csv.reader(open(filename, "r"), delimiter='\t')
-    result = list()
-    count = 0
-    for i in data:
-        tmp1 = []
-        for word in i[2].split(" "):
-            norm = normalize(word)
-            if 0 < len(norm) <= 20 and norm not in stop_words:
-                tmp1.append(norm)
-        tmp2 = []
-        for word in i[3].split(" "):
-            norm = normalize(word)
-            if 0 < len(norm) <= 20 and norm not in stop_words:
-                tmp2.append(norm)
-
-        result.append([i[0], i[1], tmp1, tmp2])
-    return result
-
-
-def normalize(term):
-    """
-    normalize word and remove useless stuff
-    """
-    return term.lower(). \
-        replace(":", ""). \
-        replace(";", ""). \
-        replace(".", ""). \
-        replace(",", ""). \
-        replace("/", ""). \
-        replace("#", ""). \
-        replace("!", ""). \
-        replace("?", ""). \
-        replace("(", ""). \
-        replace(")", ""). \
-        replace("'", ""). \
-        replace("\"", "")
+# cached arrays for feature ranking, rebuilt after learning
+weight_table = None
 
 
 def learn(data):
     global amount_good
     global amount_bad
+    global weight_table
+    weight_table = None
     for line in data:
         if line[1] == "gut":
             amount_good += 1
@@ -92,34 +43,69 @@ def add_line(line, is_good):
         feature_classification[word][is_good] += 1
 
 
+def build_weight_table():
+    """
+    precompute per-token counts and scores as arrays, so ranking features
+    only needs one pass over the vocabulary
+    """
+    global weight_table
+    words = list(feature_classification)
+    counts = np.array([feature_classification[w] for w in words],
+                      dtype=np.float64).reshape(-1, 2)
+    bad = counts[:, 0]
+    good = counts[:, 1]
+    # add-0.5 smoothed token rates per class
+    rate_good = (good + 0.5) / (good.sum() + 0.5 * len(words))
+    rate_bad = (bad + 0.5) / (bad.sum() + 0.5 * len(words))
+    weight_table = {
+        "words": words,
+        "counts": counts,
+        "diff": good - bad,
+        "log_odds": np.log(rate_good) - np.log(rate_bad),
+    }
+    return weight_table
+
+
+def strongest_features(amount, kind="any", score="diff"):
+    """
+    return the top `amount` (word, score, good count, bad count) tuples
+    kind: "good", "bad" or "any" (absolute score)
+    score: "diff" (count difference) or "log_odds"
+    """
+    table = weight_table if weight_table is not None else build_weight_table()
+    values = table[score]
+    if kind == "good":
+        keys = values
+    elif kind == "bad":
+        keys = -values
+    else:
+        keys = np.abs(values)
+    amount = min(amount, len(keys))
+    if amount == 0:
+        return []
+    # select the top k in O(V), then only sort those k
+    top = np.argpartition(-keys, amount - 1)[:amount]
+    top = top[np.argsort(-keys[top], kind="stable")]
+    counts = table["counts"]
+    return [(table["words"][i], float(values[i]),
+             int(counts[i, 1]), int(counts[i, 0])) for i in top]
+
+
+def print_features(features):
+    for word, _, good, bad in features:
+        print(word + " = (gut: " + str(good) + ", schlecht: " + str(bad) + ")")
+
+
 def print_strongest_classifier(amount):
-    list = []
-    for w in feature_classification:
-        diff = abs(feature_classification[w][0] - feature_classification[w][1])
-        list.append((diff, w))
-    list.sort(reverse=True)
-    for i in range(amount):
-        print(str(list[i][1]) + " = (gut: " + str(feature_classification[list[i][1]][0]) + ", schlecht: " + str(feature_classification[list[i][1]][1]) + ")")
+    print_features(strongest_features(amount, "any"))
 
 
 def print_strongest_good_classifier(amount):
-    list = []
-    for w in feature_classification:
-        diff = feature_classification[w][0] - feature_classification[w][1]
-        list.append((diff, w))
-    list.sort()
-    for i in range(amount):
-        print(str(list[i][1]) + " = (gut: " + str(feature_classification[list[i][1]][0]) + ", schlecht: " + str(feature_classification[list[i][1]][1]) + ")")
+    print_features(strongest_features(amount, "good"))
 
 
 def print_strongest_bad_classifier(amount):
-    list = []
-    for w in feature_classification:
-        diff = feature_classification[w][0] - feature_classification[w][1]
-        list.append((diff, w))
-    list.sort(reverse=True)
-    for i in range(amount):
-        print(str(list[i][1]) + " = (gut: " + str(feature_classification[list[i][1]][0]) + ", schlecht: " + str(feature_classification[list[i][1]][1]) + ")")
+    print_features(strongest_features(amount, "bad"))
 
 
 def weighted_prob(word, is_good):
@@ -1,3 +1,4 @@
+import numpy as np
 
 #Turn the raw data into lists consist of class and information.
 #The information include the title of review and review text.
@@ -60,7 +61,17 @@ def build_model(train_data):
     for token in Vocab:
         para_gut[token] = (freq_in_gut.get(token, 0) + 1) / (sum(freq_in_gut.values()) + len(Vocab))
         para_schlecht[token] = (freq_in_schlecht.get(token, 0) + 1) / (sum(freq_in_gut.values()) + len(Vocab))
-        
+
+    # cache the parameters as arrays for top-k lookups
+    global vocab_list
+    global para_arrays
+    vocab_list = list(Vocab)
+    para_arrays = {
+        'gut': np.array([para_gut[t] for t in vocab_list]),
+        'schlecht': np.array([para_schlecht[t] for t in vocab_list]),
+    }
+    para_arrays['log_odds'] = np.log(para_arrays['gut']) - np.log(para_arrays['schlecht'])
+
     P_gut = num_gut/total_doc
     P_schlecht = num_schlecht/total_doc
 
@@ -130,11 +141,21 @@ def evaluation(data):
     print('')
     
 
+def top_tokens(name, amount):
+    #top `amount` tokens of a cached parameter array, highest first
+    #argpartition selects them in O(V), only those get sorted
+    values = para_arrays[name]
+    amount = min(amount, len(values))
+    top = np.argpartition(-values, amount - 1)[:amount]
+    top = top[np.argsort(-values[top], kind='stable')]
+    return [vocab_list[i] for i in top]
+
+
 train_data = data_prep('games-train.csv')
 build_model(train_data)
 test_data = data_prep('games-test.csv')
 evaluation(test_data)
 
 
-print(sorted(para_gut, key=para_gut.get, reverse=True)[0:100])
-print(sorted(para_schlecht, key=para_schlecht.get, reverse=True)[0:100])
+print(top_tokens('gut', 100))
+print(top_tokens('schlecht', 100))
@@ -1,29 +1,19 @@
 #!/usr/bin/env python3
-import csv
 import random
 import math
 from collections import defaultdict
+import os
+import sys
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import feature_matrix
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "common"))
+from reviews import load_csv, normalize  # noqa: E402
+from lexicon import Lexicon  # noqa: E402
 
-stop_words = {"aber", "alle", "allem", "allen", "aller", "alles", "als", "also", "am", "an", "ander", "andere",
-              "anderem", "anderen", "anderer", "anderes", "anderm", "andern", "anders", "auch", "auf", "aus", "bei",
-              "bin", "bis", "bist", "da", "damit", "dann", "das", "dass", "dasselbe", "dazu", "daß", "dein", "deine",
-              "deinem", "deinen", "deiner", "deines", "dem", "demselben", "den", "denn", "denselben", "der", "derer",
-              "derselbe", "derselben", "des", "desselben", "dessen", "dich", "die", "dies", "diese", "dieselbe",
-              "dieselben", "diesem", "diesen", "dieser", "dieses", "dir", "doch", "dort", "du", "durch", "ein", "eine",
-              "einem", "einen", "einer", "eines", "einig", "einige", "einigem", "einigen", "einiger", "einiges",
-              "einmal", "er", "es", "etwas", "euch", "euer", "eure", "eurem", "euren", "eurer", "eures", "für", "gegen",
-              "gewesen", "hab", "habe", "haben", "hat", "hatte", "hatten", "hier", "hin", "hinter", "ich", "ihm", "ihn",
-              "ihnen", "ihr", "ihre", "ihrem", "ihren", "ihrer", "ihres", "im", "in", "indem", "ins", "ist",
-              "jede", "jedem", "jeden", "jeder", "jedes", "jene", "jenem", "jenen", "jener", "jenes", "jetzt", "kann",
-              "kein", "keine", "keinem", "keinen", "keiner", "keines", "können", "könnte", "machen", "man", "mal",
-              "manche", "manchem", "manchen", "mancher", "manches", "mein", "meine", "meinem", "meinen", "meiner",
-              "meines", "mich", "mir", "mit", "muss", "musste", "nach", "nicht", "nichts", "noch", "nun", "nur", "ob",
-              "oder", "ohne", "sehr", "sein", "seine", "seinem", "seinen", "seiner", "seines", "selbst", "sich", "sie",
-              "sind", "so", "solche", "solchem", "solchen", "solcher", "solches", "soll", "sollte", "sondern", "sonst",
-              "um", "und", "uns", "unser", "unsere", "unserem", "unseren", "unserer", "unseres", "unter", "viel", "vom",
-              "von", "vor", "war", "waren", "warst", "was", "weg", "weil", "weiter", "welche", "welchem", "welchen",
-              "welcher", "welches", "wenn", "werde", "werden", "wie", "wieder", "will", "wir", "wird", "wirst", "wo",
-              "wollen", "wollte", "während", "würde", "würden", "zu", "zum", "zur", "zwar", "zwischen", "über"}
 init_prob = 0.5
 
 feature_classification = defaultdict()
@@ -31,53 +21,6 @@ amount_good = 0
 amount_bad = 0
 
 
-def load_csv(filename):
-    data = csv.reader(open(filename, "r"), delimiter='\t')
-    result = list()
-    count = 0
-    for i in data:
-        tmp1 = []
-        for word in i[2].split(" "):
-            norm = normalize(word)
-            if 0 < len(norm) <= 20 and norm not in stop_words:
-                tmp1.append(norm)
-        tmp2 = []
-        for word in i[3].split(" "):
-            norm = normalize(word)
-            if 0 < len(norm) <= 20 and norm not in stop_words:
-                tmp2.append(norm)
-
-        result.append([i[0], i[1], tmp1, tmp2])
-    return result
-
-
-def write_csv(filename, rows):
-    with open(filename, 'w') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',',
-                            quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        for row in rows:
-            writer.writerow(row)
-
-
-def normalize(term):
-    """
-    normalize word and remove useless stuff
-    """
-    return term.lower(). \
-        replace(":", ""). \
-        replace(";", ""). \
-        replace(".", ""). \
-        replace(",", ""). \
-        replace("/", ""). \
-        replace("#", ""). \
-        replace("!", ""). \
-        replace("?", ""). \
-        replace("(", ""). \
-        replace(")", ""). \
-        replace("'", ""). \
-        replace("\"", "")
-
-
 def learn(data):
     global amount_good
     global amount_bad
@@ -134,14 +77,93 @@ def get_class(line):
     return [good, bad]
 
 
-def main():
+def get_model():
+    """
+    the trained model as a dict, so it can be stored and restored
+    """
+    return {"feature_classification": dict(feature_classification),
+            "amount_good": amount_good, "amount_bad": amount_bad}
+
+
+def use_model(model):
+    """
+    replace the current model, e.g. with one from get_model()
+    """
+    global feature_classification
+    global amount_good
+    global amount_bad
+    feature_classification = defaultdict(None, model["feature_classification"])
+    amount_good = model["amount_good"]
+    amount_bad = model["amount_bad"]
+
+
+def term_matrix(data, vocabulary):
+    """
+    documents x terms count matrix, terms get their id from the vocabulary
+    (a Lexicon)
+    unknown words are left out
+    """
+    indptr = [0]
+    indices = []
+    for line in data:
+        indices.extend(vocabulary[word] for word in line[2] + line[3]
+                       if word in vocabulary)
+        indptr.append(len(indices))
+    matrix = csr_matrix((np.ones(len(indices)), indices, indptr),
+                        shape=(len(data), len(vocabulary)))
+    matrix.sum_duplicates()
+    return matrix
+
+
+def weighted_probs(words):
+    """
+    weighted_prob() of every word for both classes as arrays (bad, good)
+    """
+    counts = np.array([feature_classification[w] for w in words],
+                      dtype=np.float64).reshape(-1, 2)
+    count = counts.sum(axis=1)
+    result = []
+    for is_good, amount in [(False, amount_bad), (True, amount_good)]:
+        fprob = counts[:, int(is_good)] / float(amount)
+        result.append((init_prob + count * fprob) / (1 + count))
+    return result
+
+
+def features(data):
+    """
+    (V1, V2) of every review in one pass: V1 is the number of words, V2 the
+    difference of the good and the bad score from get_class()
+    the products of word probabilities are sums of logs over the term matrix
+    """
+    vocabulary = Lexicon(feature_classification)
+    matrix = term_matrix(data, vocabulary)
+    bad, good = weighted_probs(vocabulary.terms)
+    # words unknown to the model have weighted_prob() = init_prob
+    known = np.asarray(matrix.sum(axis=1)).ravel()
+    lengths = np.array([len(line[2] + line[3]) for line in data],
+                       dtype=np.float64)
+    unknown = (lengths - known) * math.log(init_prob)
+    good_score = np.exp(matrix.dot(np.log(good)) + unknown)
+    bad_score = np.exp(matrix.dot(np.log(bad)) + unknown)
+    return np.column_stack([lengths, good_score - bad_score])
+
+
+def write_features(filename, table):
+    """
+    write the feature table at once, as .npy feature file (see
+    feature_matrix.py) or as csv with a V1,V2 header
+    """
+    if filename.endswith(".npy"):
+        feature_matrix.save(filename, table, ("V1", "V2"))
+    else:
+        np.savetxt(filename, table, fmt="%.17g", delimiter=",",
+                   header="V1,V2", comments="")
+
+
+def main(output="data.npy"):
     data = load_csv("games-train.csv")
     learn(data)
-    tmp = [["V1", "V2"]]
-    for line in data:
-        v = get_class(line)
-        tmp.append([float(len(line[2] + line[3])), v[0] - v[1]])
-    write_csv("data.csv", tmp)
+    write_features(output, features(data))
 
 
 if __name__ == '__main__':
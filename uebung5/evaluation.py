@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+def contingency_table(classes, clusters):
+    """
+    count matrix with one row per class and one column per cluster
+    classes and clusters are label arrays of the same length, the labels can
+    be anything hashable, they get mapped to dense indexes
+    """
+    class_values, class_idx = np.unique(classes, return_inverse=True)
+    cluster_values, cluster_idx = np.unique(clusters, return_inverse=True)
+    table = np.zeros((len(class_values), len(cluster_values)), dtype=np.int64)
+    np.add.at(table, (class_idx, cluster_idx), 1)
+    return table
+
+
+def pairs(n):
+    """
+    number of unordered pairs out of n (works element wise on arrays)
+    """
+    return n * (n - 1) // 2
+
+
+def pair_counts(table):
+    """
+    TP, FP, FN, TN over all document pairs, computed from the table instead
+    of looking at every pair
+    """
+    n = table.sum()
+    same_both = pairs(table).sum()
+    same_cluster = pairs(table.sum(axis=0)).sum()
+    same_class = pairs(table.sum(axis=1)).sum()
+    TP = same_both
+    FP = same_cluster - same_both
+    FN = same_class - same_both
+    TN = pairs(n) - TP - FP - FN
+    return int(TP), int(FP), int(FN), int(TN)
+
+
+def rand_index(table):
+    TP, FP, FN, TN = pair_counts(table)
+    total = TP + FP + FN + TN
+    if total == 0:
+        return 1.0
+    return float(TP + TN) / total
+
+
+def adjusted_rand_index(table):
+    """
+    rand index corrected for chance (Hubert and Arabie)
+    """
+    n = table.sum()
+    index = pairs(table).sum()
+    sum_classes = pairs(table.sum(axis=1)).sum()
+    sum_clusters = pairs(table.sum(axis=0)).sum()
+    total = pairs(n)
+    if total == 0:
+        return 1.0
+    expected = float(sum_classes) * sum_clusters / total
+    maximum = (sum_classes + sum_clusters) / 2.0
+    if maximum == expected:
+        return 1.0
+    return float((index - expected) / (maximum - expected))
+
+
+def entropy(counts):
+    p = counts[counts > 0] / float(counts.sum())
+    return -np.sum(p * np.log(p))
+
+
+def normalized_mutual_information(table):
+    """
+    mutual information of classes and clusters, divided by the mean of both
+    entropies
+    """
+    n = float(table.sum())
+    classes = table.sum(axis=1)
+    clusters = table.sum(axis=0)
+    rows, cols = np.nonzero(table)
+    joint = table[rows, cols] / n
+    mutual = np.sum(joint * np.log(joint * n * n /
+                                   (classes[rows] * clusters[cols])))
+    mean_entropy = (entropy(classes) + entropy(clusters)) / 2.0
+    if mean_entropy == 0:
+        return 1.0
+    return float(mutual / mean_entropy)
+
+
+def purity(table):
+    """
+    fraction of documents which belong to the majority class of their cluster
+    """
+    return float(table.max(axis=0).sum() / table.sum())
+
+
+def evaluate(classes, clusters):
+    """
+    all metrics at once, as a dict
+    """
+    table = contingency_table(classes, clusters)
+    return {
+        "rand_index": rand_index(table),
+        "adjusted_rand_index": adjusted_rand_index(table),
+        "nmi": normalized_mutual_information(table),
+        "purity": purity(table),
+    }
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import numpy as np
+
+# Feature tables are stored as .npy files with one float64 field per column,
+# so the column names live in the .npy header next to shape and dtype and the
+# data after it is a plain row major (rows, columns) float64 block.
+# np.load(mmap_mode='r') maps that block without parsing or copying.
+# Plain 2-D arrays (np.save) can be loaded too, with generated column names.
+
+
+def create(filename, rows, columns=("V1", "V2")):
+    """
+    create a feature file and return it as a writable (rows, columns) array,
+    which is backed by the file (rows can be written chunk by chunk)
+    """
+    dtype = np.dtype([(name, "<f8") for name in columns])
+    table = np.lib.format.open_memmap(filename, mode="w+", dtype=dtype,
+                                      shape=(rows,))
+    return table.view("<f8").reshape(rows, len(columns))
+
+
+def save(filename, table, columns=("V1", "V2")):
+    """
+    write a (rows, columns) table to a feature file
+    """
+    out = create(filename, len(table), columns)
+    out[:] = table
+    out.flush()
+
+
+def load(filename):
+    """
+    map a feature file, returns the read only (rows, columns) float64 array
+    and the column names
+    a plain 2-D array saved with np.save is loaded as well, its columns are
+    named V1, V2, ...
+    """
+    table = np.load(filename, mmap_mode="r")
+    columns = table.dtype.names
+    if columns is None:
+        if table.ndim != 2:
+            raise ValueError("%s: expected a 2-D array, got shape %s"
+                             % (filename, table.shape))
+        if table.dtype != np.float64:
+            table = table.astype(np.float64)
+        return table, tuple("V%d" % (i + 1) for i in range(table.shape[1]))
+    if any(table.dtype[name] != np.float64 for name in columns):
+        raise ValueError("%s: feature columns must be float64" % filename)
+    return table.view("<f8").reshape(len(table), len(columns)), columns
+
+
+def column_indexes(columns, names):
+    return [columns.index(name) for name in names]
@@ -1,76 +1,387 @@
 #!/usr/bin/env python3
-from copy import deepcopy
+from multiprocessing import Pool
+import os
 import numpy as np
 import pandas as pd
-from matplotlib import pyplot as plt
 
+import feature_matrix
 
-def dist(a, b, ax=1):
+
+def squared_distances(X, C):
     """
-    Euclidean Distance
+    squared euclidean distance of every point to every centroid, shape (n, k)
+    uses |x|^2 - 2 x.c + |c|^2 so no (n, k, d) temporary is created
     """
-    return np.linalg.norm(a - b, axis=ax)
+    d = np.einsum('ij,ij->i', X, X)[:, None] - 2 * X.dot(C.T) + \
+        np.einsum('ij,ij->i', C, C)[None, :]
+    # rounding can push values slightly below zero
+    return np.maximum(d, 0)
 
 
-def k_means(file, k=3):
-    plt.rcParams['figure.figsize'] = (120, 40)
-    plt.style.use('ggplot')
+def assign(X, C):
+    """
+    index of the closest centroid for each point
+    """
+    return np.argmin(squared_distances(X, C), axis=1)
 
-    # Importing the dataset
-    data = pd.read_csv(file)
-    data.head()
 
-    # Getting the values and plotting it
-    f1 = data['V1'].values
-    f2 = data['V2'].values
-    X = np.array(list(zip(f1, f2)))
-    plt.scatter(f1, f2, c='black', s=7)
+def update(X, clusters, C):
+    """
+    new centroids as the mean of their points, empty clusters keep their
+    old position
+    """
+    k = len(C)
+    counts = np.bincount(clusters, minlength=k)
+    sums = np.empty((k, X.shape[1]), dtype=np.float64)
+    # one weighted bincount per dimension, much faster than np.add.at
+    for j in range(X.shape[1]):
+        sums[:, j] = np.bincount(clusters, weights=X[:, j], minlength=k)
+    new = C.copy()
+    filled = counts > 0
+    new[filled] = sums[filled] / counts[filled, None]
+    return new
+
+
+def k_means_plus_plus(X, k, rng=np.random):
+    """
+    k-means++ seeding: the first centroid is a random point, every further one
+    is drawn with probability proportional to its squared distance to the
+    closest centroid chosen so far
+    """
+    C = np.empty((k, X.shape[1]), dtype=np.float64)
+    C[0] = X[rng.randint(len(X))]
+    closest = squared_distances(X, C[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        if total == 0:
+            # less distinct points than clusters
+            C[i] = X[rng.randint(len(X))]
+        else:
+            # rounding can leave the last cumulative sum below total
+            pick = np.searchsorted(np.cumsum(closest), rng.rand() * total)
+            C[i] = X[min(pick, len(X) - 1)]
+        closest = np.minimum(closest, squared_distances(X, C[i:i + 1])[:, 0])
+    return C
+
 
-    # X coordinates of random centroids
-    C_x = np.random.rand(k, 1)[:, 0]
-    # Y coordinates of random centroids
-    C_y = np.random.rand(k, 1)[:, 0]
-    C = np.array(list(zip(C_x, C_y)), dtype=np.float32)
+def random_centroids(X, k, rng=np.random):
+    """
+    uniformly random centroids inside the bounding box of the data
+    """
+    low = X.min(axis=0)
+    high = X.max(axis=0)
+    return low + rng.rand(k, X.shape[1]) * (high - low)
 
-    # Plotting along with the Centroids
-    plt.scatter(f1, f2, c='#050505', s=7)
-    plt.scatter(C_x, C_y, marker='*', s=200, c='g')
 
-    # To store the value of centroids when it updates
-    C_old = np.zeros(C.shape)
+def lloyd(X, C, tol=1e-4, max_iter=300):
+    """
+    run Lloyd iterations from the centroids C until the centroids move less
+    than tol (relative to the mean variance of the data) or max_iter is hit
+    returns labels, centroids, final inertia (sum of squared distances), the
+    inertia after every iteration and the distance computations skipped per
+    iteration (always 0 here)
+    """
+    C = C.astype(np.float32)
+    # the tolerance is scaled with the data, so it does not depend on units
+    threshold = tol * np.mean(np.var(X, axis=0))
+    history = []
     # Cluster Lables(0, 1, 2)
-    clusters = np.zeros(len(X))
-    # Error func. - Distance between new centroids and old centroids
-    error = dist(C, C_old, None)
-    # Loop will run till the error becomes zero
-    while error != 0:
+    clusters = np.zeros(len(X), dtype=np.intp)
+    for iteration in range(max_iter):
         # Assigning each value to its closest cluster
-        for i in range(len(X)):
-            distances = dist(X[i], C)
-            cluster = np.argmin(distances)
-            clusters[i] = cluster
+        distances = squared_distances(X, C)
+        clusters = np.argmin(distances, axis=1)
+        history.append(distances[np.arange(len(X)), clusters].sum())
         # Storing the old centroid values
-        C_old = deepcopy(C)
+        C_old = C
         # Finding the new centroids by taking the average value
-        for i in range(k):
-            points = [X[j] for j in range(len(X)) if clusters[j] == i]
-            if len(points) == 0:
-                continue
-            C[i] = np.mean(points, axis=0)
-        error = dist(C, C_old, None)
-
-    colors = ['r', 'g', 'b', 'y', 'c', 'm']
-    fig, ax = plt.subplots()
-    for i in range(k):
-        points = np.array([X[j] for j in range(len(X)) if clusters[j] == i])
-        if len(points) == 0:
-            print("no points found for centroid")
-            continue
-        ax.scatter(points[:, 0], points[:, 1], s=7, c=colors[i % 6])
-        ax.scatter(C[i, 0], C[i, 1], marker='*', s=200, c='#050505')
-    plt.savefig(str('result-' + str(k) + '.png'))
+        C = update(X, clusters, C).astype(np.float32)
+        # squared movement of all centroids together
+        if np.sum((C - C_old) ** 2) <= threshold:
+            break
+    clusters = assign(X, C)
+    inertia = squared_distances(X, C)[np.arange(len(X)), clusters].sum()
+    return clusters, C, inertia, history, [0] * len(history)
+
+
+def own_distances(X, C, clusters):
+    """
+    euclidean distance of every point to its own centroid
+    """
+    return np.sqrt(np.sum((X - C[clusters]) ** 2, axis=1))
+
+
+def mean_inertia(square_sum, clusters, C):
+    """
+    inertia of the clusters if every centroid of a non-empty cluster is the
+    mean of its points: sum |x|^2 - sum n_j |c_j|^2, so no distance has to be
+    computed
+    square_sum: sum of the squared norms of all points
+    """
+    counts = np.bincount(clusters, minlength=len(C))
+    return square_sum - np.sum(counts * np.sum(C ** 2, axis=1))
+
+
+def centroid_distances(C):
+    """
+    euclidean distances between all centroids and, for every centroid, half
+    the distance to its closest other centroid
+    """
+    cc = np.sqrt(squared_distances(C, C))
+    np.fill_diagonal(cc, np.inf)
+    return cc, 0.5 * cc.min(axis=1)
+
+
+def hamerly(X, C, tol=1e-4, max_iter=300):
+    """
+    Lloyd iterations with Hamerly's bounds: one upper bound (distance to the
+    own centroid) and one lower bound (distance to the second closest) per
+    point. A point is only looked at again, if its upper bound is above the
+    lower bound or half the distance of its centroid to the next one.
+    same results and return values as lloyd(), but history holds the inertia
+    after the update of every iteration (to the new centroids)
+    """
+    C = C.astype(np.float32)
+    n, k = len(X), len(C)
+    threshold = tol * np.mean(np.var(X, axis=0))
+    distances = np.sqrt(squared_distances(X, C))
+    clusters = np.argmin(distances, axis=1)
+    upper = distances[np.arange(n), clusters]
+    if k > 1:
+        lower = np.partition(distances, 1, axis=1)[:, 1]
+    else:
+        lower = np.full(n, np.inf)
+    square_sum = np.sum(X.astype(np.float64) ** 2)
+    history = []
+    skipped = []
+    for iteration in range(max_iter):
+        C_old = C
+        means = update(X, clusters, C)
+        # the bounds do not give the distances, the inertia comes from the
+        # new means instead
+        history.append(mean_inertia(square_sum, clusters, means))
+        C = means.astype(np.float32)
+        shift = np.sqrt(np.sum((C.astype(np.float64) - C_old) ** 2, axis=1))
+        # the bounds move at most as far as the centroids did
+        upper += shift[clusters]
+        if k > 1:
+            order = np.argsort(shift)
+            largest, second = shift[order[-1]], shift[order[-2]]
+            lower -= np.where(clusters == order[-1], second, largest)
+        cc, half = centroid_distances(C)
+        bound = np.maximum(half[clusters], lower)
+        check = np.flatnonzero(upper > bound)
+        computed = len(check)
+        # tighten the upper bound first, maybe that is already enough
+        upper[check] = own_distances(X[check], C, clusters[check])
+        check = check[upper[check] > bound[check]]
+        if len(check) > 0:
+            distances = np.sqrt(squared_distances(X[check], C))
+            computed += len(check) * k
+            clusters[check] = np.argmin(distances, axis=1)
+            upper[check] = distances[np.arange(len(check)), clusters[check]]
+            if k > 1:
+                lower[check] = np.partition(distances, 1, axis=1)[:, 1]
+        skipped.append(n * k - computed)
+        if np.sum(shift ** 2) <= threshold:
+            break
+    inertia = np.sum(own_distances(X, C, clusters) ** 2)
+    return clusters, C, inertia, history, skipped
+
+
+def elkan(X, C, tol=1e-4, max_iter=300):
+    """
+    Lloyd iterations with Elkan's bounds: one upper bound per point and one
+    lower bound per point and centroid. Only the point/centroid pairs which
+    can not be excluded by the triangle inequality are computed. That saves
+    the most computations, but the per pair bookkeeping made it slower than
+    Lloyd in the measurements of choose_algorithm().
+    same results and return values as hamerly()
+    """
+    C = C.astype(np.float32)
+    n, k = len(X), len(C)
+    threshold = tol * np.mean(np.var(X, axis=0))
+    lower = np.sqrt(squared_distances(X, C))
+    clusters = np.argmin(lower, axis=1)
+    upper = lower[np.arange(n), clusters]
+    square_sum = np.sum(X.astype(np.float64) ** 2)
+    history = []
+    skipped = []
+    for iteration in range(max_iter):
+        C_old = C
+        means = update(X, clusters, C)
+        # the bounds do not give the distances, the inertia comes from the
+        # new means instead
+        history.append(mean_inertia(square_sum, clusters, means))
+        C = means.astype(np.float32)
+        shift = np.sqrt(np.sum((C.astype(np.float64) - C_old) ** 2, axis=1))
+        lower = np.maximum(lower - shift[None, :], 0)
+        upper += shift[clusters]
+        cc, half = centroid_distances(C)
+        # points which are closer to their centroid than half way to the next
+        # centroid keep their cluster
+        check = np.flatnonzero(upper > half[clusters])
+        own = clusters[check]
+        candidates = (upper[check, None] > lower[check]) & \
+            (upper[check, None] > 0.5 * cc[own])
+        check, own, candidates = check[candidates.any(axis=1)], \
+            own[candidates.any(axis=1)], candidates[candidates.any(axis=1)]
+        computed = len(check)
+        upper[check] = own_distances(X[check], C, own)
+        lower[check, own] = upper[check]
+        candidates &= (upper[check, None] > lower[check]) & \
+            (upper[check, None] > 0.5 * cc[own])
+        rows, cols = np.nonzero(candidates)
+        computed += len(rows)
+        points = check[rows]
+        lower[points, cols] = np.sqrt(np.sum((X[points] - C[cols]) ** 2,
+                                             axis=1))
+        # best centroid among the own one and all computed candidates
+        best = np.full((len(check), k), np.inf)
+        best[np.arange(len(check)), own] = upper[check]
+        best[rows, cols] = lower[points, cols]
+        clusters[check] = np.argmin(best, axis=1)
+        upper[check] = best.min(axis=1)
+        skipped.append(n * k - computed)
+        if np.sum(shift ** 2) <= threshold:
+            break
+    inertia = np.sum(own_distances(X, C, clusters) ** 2)
+    return clusters, C, inertia, history, skipped
+
+
+algorithms = {'lloyd': lloyd, 'hamerly': hamerly, 'elkan': elkan}
+
+
+def choose_algorithm(algorithm):
+    """
+    'auto' takes Hamerly: with these vectorized bounds it was the fastest
+    for 2 to 128 dimensions and k = 20 or 100 (50000 points), Elkan was
+    slower than Lloyd there and has to be chosen explicitly
+    """
+    if algorithm == 'auto':
+        algorithm = 'hamerly'
+    return algorithms[algorithm]
+
+
+def single_run(args):
+    """
+    one independent restart, used as a process pool task
+    """
+    X, k, init, seed, tol, max_iter, algorithm = args
+    rng = np.random.RandomState(seed)
+    if init == 'k-means++':
+        C = k_means_plus_plus(X, k, rng)
+    else:
+        C = random_centroids(X, k, rng)
+    return choose_algorithm(algorithm)(X, C, tol, max_iter)
+
+
+def cluster(X, k=3, init='k-means++', n_init=1, processes=None, tol=1e-4,
+            max_iter=300, algorithm='auto'):
+    """
+    run n_init restarts (in parallel if n_init > 1) and keep the one with the
+    lowest inertia
+    algorithm: 'lloyd', 'hamerly', 'elkan' or 'auto'
+    """
+    seeds = np.random.randint(2 ** 31 - 1, size=n_init)
+    tasks = [(X, k, init, seed, tol, max_iter, algorithm) for seed in seeds]
+    if n_init == 1:
+        results = [single_run(tasks[0])]
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(single_run, tasks)
+    return min(results, key=lambda result: result[2])
+
+
+def read_features(file, names=('V1', 'V2')):
+    """
+    the (rows, 2) feature matrix of a .npy feature file (mapped, no copy as
+    long as the file holds only these columns) or of a csv file
+    """
+    if file.endswith('.npy'):
+        table, columns = feature_matrix.load(file)
+        if list(columns) == list(names):
+            return table
+        return table[:, feature_matrix.column_indexes(columns, names)]
+    return pd.read_csv(file)[list(names)].values
+
+
+def k_means(file, k=3, init='k-means++', n_init=1, tol=1e-4, max_iter=300,
+            algorithm='auto'):
+    """
+    cluster the (V1, V2) features of a csv file
+    returns the feature matrix, the label of every point and the centroids,
+    plotting is left to plot.plot_clusters()
+    """
+    X = read_features(file)
+
+    clusters, C = cluster(X, k, init, n_init, tol=tol, max_iter=max_iter,
+                          algorithm=algorithm)[:2]
+    return X, clusters, C
+
+
+def read_batches(file, batch_size):
+    """
+    stream the feature file (or an in-memory feature matrix) as
+    (batch_size, 2) arrays instead of loading it
+    """
+    if isinstance(file, np.ndarray) or file.endswith('.npy'):
+        X = file if isinstance(file, np.ndarray) else read_features(file)
+        for start in range(0, len(X), batch_size):
+            yield np.asarray(X[start:start + batch_size], dtype=np.float64)
+        return
+    for chunk in pd.read_csv(file, chunksize=batch_size):
+        yield chunk[['V1', 'V2']].values.astype(np.float64)
+
+
+def mini_batch_update(batch, C, counts):
+    """
+    one mini-batch step: every centroid moves towards the points assigned to
+    it with a per-centroid learning rate of 1 / (points seen so far)
+    """
+    clusters = assign(batch, C)
+    k = len(C)
+    batch_counts = np.bincount(clusters, minlength=k)
+    sums = np.empty(C.shape, dtype=np.float64)
+    for j in range(batch.shape[1]):
+        sums[:, j] = np.bincount(clusters, weights=batch[:, j], minlength=k)
+    counts += batch_counts
+    filled = batch_counts > 0
+    # c <- c + (sum(x) - n_batch * c) / n_seen, the averaged form of the
+    # per-point gradient step
+    C[filled] += (sums[filled] - batch_counts[filled, None] * C[filled]) / \
+        counts[filled, None]
+    return C
+
+
+def mini_batch_k_means(file, k=3, batch_size=1024, epochs=3):
+    """
+    k-means on a file which is too big for memory: the centroids are trained
+    on one batch at a time and the labels are assigned in a final streaming
+    pass, so only one batch and the labels are held in memory
+    """
+    batches = read_batches(file, batch_size)
+    first = next(batches)
+    # seed with k-means++ on the first batch
+    C = k_means_plus_plus(first, k)
+    counts = np.zeros(k, dtype=np.int64)
+    for epoch in range(epochs):
+        if epoch > 0:
+            batches = read_batches(file, batch_size)
+        else:
+            C = mini_batch_update(first, C, counts)
+        for batch in batches:
+            C = mini_batch_update(batch, C, counts)
+    clusters = np.concatenate([assign(batch, C)
+                               for batch in read_batches(file, batch_size)])
+    return clusters, C
 
 
 if __name__ == '__main__':
-    k_means('data.csv', 2)
-    k_means('data.csv', 20)
+    # only the script needs matplotlib, the clustering itself does not
+    from plot import plot_clusters
+    # the binary export of data_export.py if there is one
+    file = 'data.npy' if os.path.exists('data.npy') else 'data.csv'
+    for k in [2, 20]:
+        X, clusters, C = k_means(file, k, n_init=4)
+        plot_clusters(X, clusters, C, 'result-' + str(k) + '.png')
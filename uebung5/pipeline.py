@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+from collections import namedtuple
+import dis
+import hashlib
+import os
+import pickle
+import sys
+import types
+import numpy as np
+
+import data_export
+import k_means as km
+
+# A stage computes one named artifact from the artifacts named in inputs.
+# params are passed to run() as keyword arguments and are part of the cache
+# key, so changing them recomputes the stage (and everything after it).
+Stage = namedtuple("Stage", ["name", "inputs", "run", "params"])
+
+# modules below this directory are part of the cache keys of the stages
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def file_hash(filename, block_size=1 << 20):
+    """
+    sha256 of the content of a file, read block by block
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(function):
+    """
+    qualified name and bytecode of a function and the file hashes of the
+    modules of this repository it uses (directly or through their imports),
+    so editing a stage function or anything it calls changes its cache key
+    """
+    modules = dependencies(function)
+    return "%s.%s:%s:%r" % (
+        function.__module__, function.__qualname__,
+        code_fingerprint(function.__code__),
+        [(name, file_hash(modules[name].__file__))
+         for name in sorted(modules)])
+
+
+def code_fingerprint(code):
+    # nested code objects (lambdas, comprehensions) would be repr'd with
+    # their memory address
+    return code.co_code.hex() + repr(tuple(
+        code_fingerprint(const) if hasattr(const, "co_code") else const
+        for const in code.co_consts))
+
+
+def code_names(code):
+    """
+    global names used by a code object and its nested code objects (not
+    attribute names like features in data_export.features)
+    """
+    names = set(instruction.argval
+                for instruction in dis.get_instructions(code)
+                if instruction.opname == "LOAD_GLOBAL")
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            names |= code_names(const)
+    return names
+
+
+def local_module(value):
+    """
+    the module of this repository which is or defines a global (module,
+    function or class), None for anything else (e.g. numpy)
+    """
+    if isinstance(value, types.ModuleType):
+        module = value
+    else:
+        module = sys.modules.get(getattr(value, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path and os.path.abspath(path).startswith(root + os.sep):
+        return module
+    return None
+
+
+def dependencies(function):
+    """
+    name -> module of the modules of this repository a function uses,
+    including everything they import from this repository
+    """
+    pending = [local_module(function.__globals__[name])
+               for name in code_names(function.__code__)
+               if name in function.__globals__]
+    modules = {}
+    while pending:
+        module = pending.pop()
+        if module is None or module.__name__ in modules:
+            continue
+        modules[module.__name__] = module
+        pending.extend(local_module(value) for value in vars(module).values())
+    return modules
+
+
+def tokenize(path):
+    return data_export.load_csv(path)
+
+
+def train(tokens):
+    data_export.use_model({"feature_classification": {},
+                           "amount_good": 0, "amount_bad": 0})
+    data_export.learn(tokens)
+    return data_export.get_model()
+
+
+def features(tokens, model):
+    data_export.use_model(model)
+    return data_export.features(tokens)
+
+
+def cluster(features, k=20, n_init=1, batch_size=None, algorithm="auto"):
+    """
+    labels and centroids, with mini-batch k-means if batch_size is given
+    """
+    if batch_size:
+        return km.mini_batch_k_means(np.asarray(features), k, batch_size)
+    clusters, C, inertia, history, skipped = km.cluster(
+        np.asarray(features), k, n_init=n_init, algorithm=algorithm)
+    return clusters, C
+
+
+def default_stages(k=20, n_init=1, batch_size=None):
+    """
+    reviews -> tokens -> Naive Bayes model -> (V1, V2) features -> clusters
+    """
+    return [
+        Stage("tokens", ["input"], tokenize, {}),
+        Stage("model", ["tokens"], train, {}),
+        Stage("features", ["tokens", "model"], features, {}),
+        Stage("clusters", ["features"], cluster,
+              {"k": k, "n_init": n_init, "batch_size": batch_size}),
+    ]
+
+
+class Pipeline:
+    """
+    Runs stages on an input file. Every artifact is cached on disk under a
+    key made of the input file hash and the names, code (see fingerprint())
+    and params of the stages leading to it, so a rerun only computes stages
+    whose input, code or parameters changed. Artifacts are loaded lazily: a
+    cached later stage does not need the earlier artifacts at all.
+    """
+    def __init__(self, input_file, stages, cache_dir=".cache"):
+        self.input_file = input_file
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.artifacts = {"input": input_file}
+        self.keys = {"input": file_hash(input_file)}
+        self.computed = []
+
+    def key(self, name):
+        if name not in self.keys:
+            stage = self.stages[name]
+            digest = hashlib.sha256(name.encode())
+            digest.update(fingerprint(stage.run).encode())
+            digest.update(repr(sorted(stage.params.items())).encode())
+            for dependency in stage.inputs:
+                digest.update(self.key(dependency).encode())
+            self.keys[name] = digest.hexdigest()
+        return self.keys[name]
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name + "-" + self.key(name)[:16])
+
+    def load(self, name):
+        path = self.path(name)
+        if os.path.exists(path + ".npy"):
+            return np.load(path + ".npy", mmap_mode="r")
+        if os.path.exists(path + ".pickle"):
+            with open(path + ".pickle", "rb") as file:
+                return pickle.load(file)
+        return None
+
+    def store(self, name, artifact):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(name)
+        if isinstance(artifact, np.ndarray):
+            np.save(path + ".npy", artifact)
+        else:
+            with open(path + ".pickle", "wb") as file:
+                pickle.dump(artifact, file, pickle.HIGHEST_PROTOCOL)
+
+    def get(self, name):
+        """
+        the artifact of a stage, from memory, from the cache or computed
+        """
+        if name in self.artifacts:
+            return self.artifacts[name]
+        artifact = self.load(name)
+        if artifact is None:
+            stage = self.stages[name]
+            inputs = [self.get(dependency) for dependency in stage.inputs]
+            artifact = stage.run(*inputs, **stage.params)
+            self.store(name, artifact)
+            self.computed.append(name)
+        self.artifacts[name] = artifact
+        return artifact
+
+
+def main(input_file="games-train.csv", k=20):
+    pipeline = Pipeline(input_file, default_stages(k))
+    clusters, C = pipeline.get("clusters")
+    if pipeline.computed:
+        print("computed: " + ", ".join(pipeline.computed))
+    else:
+        print("everything cached")
+    print("cluster sizes: " + str(np.bincount(clusters, minlength=k)))
+
+
+if __name__ == "__main__":
+    # pipeline.py [input file] [k]
+    args = sys.argv[1:]
+    main(args[0] if args else "games-train.csv",
+         int(args[1]) if len(args) > 1 else 20)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+def plot_clusters(X, clusters, C, filename, max_points=100000, hexbin=None,
+                  seed=0):
+    """
+    render a clustering of 2d points to an image file
+    more than max_points points are randomly downsampled before drawing, with
+    hexbin=True (default: only above max_points) the point density is drawn
+    as hexagonal bins instead of single points
+    matplotlib is only imported here, so clustering works without it
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    plt.style.use('ggplot')
+    if hexbin is None:
+        hexbin = len(X) > max_points
+    colors = ['r', 'g', 'b', 'y', 'c', 'm']
+    # counted before downsampling, a sample can miss a small cluster
+    sizes = np.bincount(clusters, minlength=len(C))
+    fig, ax = plt.subplots(figsize=(12, 4))
+    if hexbin:
+        ax.hexbin(X[:, 0], X[:, 1], gridsize=200, bins='log', cmap='Greys')
+    else:
+        if len(X) > max_points:
+            rng = np.random.RandomState(seed)
+            sample = rng.choice(len(X), max_points, replace=False)
+            X, clusters = X[sample], clusters[sample]
+        for i in range(len(C)):
+            points = X[clusters == i]
+            if len(points) == 0:
+                continue
+            ax.scatter(points[:, 0], points[:, 1], s=7, c=colors[i % 6])
+    for i in range(len(C)):
+        if sizes[i] == 0:
+            print("no points found for centroid")
+            continue
+        ax.scatter(C[i, 0], C[i, 1], marker='*', s=200, c='#050505')
+    fig.savefig(filename, dpi=200)
+    plt.close(fig)
@@ -1,35 +1,68 @@
+import os
+import sys
 import numpy as np
+from scipy.sparse import csr_matrix
+
+import evaluation
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+import corpus_cache
 
 filepath = "games-train.csv"
 
+def splitReview(line):
+    """
+    Splits a line of the reviews file into its columns and the words of the text (4th column)
+    """
+    review = line.split('\t')
+    return review[:3] + review[4:], [review[3].split(' ')]
+
 class KMeans:
     debug = False
     reviews = []
-    vectors = []
+    documents = []
+    matrix = None
+    labels = None
     words = []
+    vocabulary = {}
     clusters = []
     centroids = []
     closest = []
     classes = set()
-    maxVector = []
     solution = []
+    classLabels = None
     data_length = None
     TP = FP = TN = FN = 0
+    metrics = {}
     K = 0
     dim = 0
-    def __init__(self, length = None, debug = False):
+    inertia = []
+    iterations = 0
+    spherical = False
+    accelerated = False
+    upper = None
+    lower = None
+    shifts = None
+    skipped = []
+    def __init__(self, length = None, debug = False, spherical = False, accelerated = False):
+        """
+        :param spherical: Cluster L2-normalized TF-IDF vectors by cosine similarity instead of raw counts by euclidean distance
+        :param accelerated: Skip distance computations which can not change the assignment (Hamerly's bounds)
+        """
         self.data_length = length
+        self.spherical = spherical
+        self.accelerated = accelerated
     def read_data(self, path, length = None):
         """
-        Reads data from a file specified by path.
+        Reads data from a file specified by path. The split reviews come from the corpus cache if the file was read before.
         """
         self.reviews = []
         #print("Read Data")
-        data = open(path, 'r')
-        lines = data.readlines()
+        corpus = corpus_cache.load(path, splitReview, ("uebung5/python-solution.py", 1))
         i = 0
-        for line in lines:
-            review = line.split('\t')
+        for labels, (words,) in corpus_cache.documents(corpus):
+            #the text (4th column) is the only tokenized one, joining its words gives it back unchanged
+            review = list(labels[:3]) + [' '.join(words)] + list(labels[3:])
             self.reviews.append(review)
             if length is not None and i >= length:
                 break
@@ -44,197 +77,329 @@ class KMeans:
             self.classes.add(review[reviewIdx]) #Classes are "good" and "bad". This works for general Classes, though like for instance games
         self.classes = list(self.classes) #We need some kind of order!
         self.K = len(self.classes)
-        self.solution = [[] for _ in range(self.K)]
-        self.clusters = [[] for _ in range(self.K)]
-        for review in self.reviews:
-            if review[3] is not None:
-                self.solution[self.classes.index(review[reviewIdx])].append(self.doc2Vec(review[3]))
+    def buildSolution(self):
+        """
+        Sets self.classLabels (actual class of every matrix row) and self.solution (row indexes of every class)
+        """
+        reviewIdx = 1
+        self.classLabels = np.array([self.classes.index(self.reviews[idx][reviewIdx]) for idx in self.documents], dtype=np.intp)
+        self.solution = [np.flatnonzero(self.classLabels == i) for i in range(len(self.classes))]
     def doc2Vec(self, doc):
         """
-        Converts a document into a vector
+        Converts a document into a (dense) vector
         """
-        vector = np.zeros(self.dim)
-        docWords = doc.split(' ')
-        for word in docWords:
-            pos = self.words.index(word)
-            vector[pos] += 1
-        return vector
-    def findReview(self, vec):
+        ids = [self.vocabulary[word] for word in doc.split(' ') if word in self.vocabulary]
+        return np.bincount(ids, minlength=self.dim).astype(np.float64)
+    def findReview(self, row):
         """
-        Finds a Review given a vector.
+        Finds the Review of a row of self.matrix.
         """
-        for review in self.reviews:
-            if np.array_equal(self.doc2Vec(review[3]), vec):
-                return review
-        return None
+        if row is None or row < 0:
+            return None
+        return self.reviews[self.documents[row]]
     def initWords(self):
         """
-        This will get all words of all documents and save them to self.words
+        This will get all words of all documents and save them to self.words, self.vocabulary maps every word to its position
         """
         #print("InitWords")
         self.words = []
+        self.vocabulary = {}
         for review in self.reviews:
             doc = review[3]
             if (doc):
                 docWords = doc.split(' ')
                 for word in docWords:
-                    if not word in self.words:
+                    if not word in self.vocabulary:
+                        self.vocabulary[word] = len(self.words)
                         self.words.append(word)
         self.dim = len(self.words)
         #print("Dimension: " + str(self.dim))
     def initVectors(self):
         """
-        This will Initialize all vectors accordingly to self.words
+        This will build the sparse document-term matrix (one row per non-empty review) accordingly to self.vocabulary
         """
         #print("InitVectors")
-        self.vectors = []
-        for review in self.reviews:
+        indptr = [0]
+        indices = []
+        self.documents = []
+        for idx, review in enumerate(self.reviews):
             doc = review[3]
             if (doc):
-                self.vectors.append(self.doc2Vec(doc))
+                indices.extend(self.vocabulary[word] for word in doc.split(' '))
+                indptr.append(len(indices))
+                self.documents.append(idx)
+        data = np.ones(len(indices))
+        self.matrix = csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, self.dim))
+        #repeated words become counts
+        self.matrix.sum_duplicates()
+        if self.spherical:
+            self.tfidf()
+    def tfidf(self):
+        """
+        Weights self.matrix with (1 + log10 N/df) and normalizes every row to unit length
+        """
+        documents = self.matrix.shape[0]
+        df = np.bincount(self.matrix.indices, minlength=self.dim)
+        idf = 1.0 + np.log10(documents / np.maximum(df, 1))
+        self.matrix = self.matrix.multiply(idf[None, :]).tocsr()
+        lengths = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        lengths[lengths == 0] = 1
+        self.matrix = csr_matrix(self.matrix.multiply(1 / lengths[:, None]))
+    def unit(self, vector):
+        """
+        Scales a centroid to unit length (spherical K-Means only)
+        """
+        length = np.linalg.norm(vector)
+        return vector / length if length > 0 else vector
+    def squaredDistances(self, centroids, rows = None):
+        """
+        Squared euclidean distances of every row of self.matrix (or only the given rows) to every centroid, shape (documents, centroids)
+        """
+        centroids = np.atleast_2d(centroids)
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        rowNorms = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+        distances = rowNorms[:, None] - 2 * matrix.dot(centroids.T) + (centroids ** 2).sum(axis=1)[None, :]
+        return np.maximum(distances, 0)
+    def ownDistances(self, rows = None):
+        """
+        Euclidean distance of every row (or only the given rows) to the centroid of its cluster (one sparse matrix-vector product per cluster)
+        """
+        rows = np.arange(len(self.labels)) if rows is None else rows
+        labels = self.labels[rows]
+        distances = np.empty(len(rows))
+        for i in range(self.K):
+            members = np.flatnonzero(labels == i)
+            if len(members) > 0:
+                distances[members] = self.squaredDistances(self.centroids[i], rows[members])[:, 0]
+        return np.sqrt(distances)
+    def setBounds(self, distances):
+        """
+        Initializes Hamerly's bounds from the full (euclidean) distance matrix
+        """
+        rows = np.arange(len(self.labels))
+        self.upper = distances[rows, self.labels]
+        if self.K > 1:
+            self.lower = np.partition(distances, 1, axis=1)[:, 1]
+        else:
+            self.lower = np.full(len(rows), np.inf)
+    def assignBounded(self):
+        """
+        assign-phase with Hamerly's bounds: a vector keeps its cluster if the upper bound of the distance to its centroid does not exceed the lower bound to every other centroid (or half the distance between its centroid and the next one).
+        Only for the other vectors the distance to the own centroid is computed, and only those which still fail are compared with all centroids
+        """
+        centroids = np.array(self.centroids)
+        #the upper bound grew by the shift of the own centroid (recompute), the lower bound shrinks by at most the largest shift of another centroid
+        if self.K > 1:
+            order = np.argsort(self.shifts)
+            self.lower -= np.where(self.labels == order[-1], self.shifts[order[-2]], self.shifts[order[-1]])
+        between = np.sqrt(self.squaredDistancesBetween(centroids))
+        np.fill_diagonal(between, np.inf)
+        half = 0.5 * between.min(axis=1)
+        bound = np.maximum(half[self.labels], self.lower)
+        computed = 0
+        check = np.flatnonzero(self.upper > bound)
+        if len(check) > 0:
+            #tighten the upper bound to the exact distance
+            self.upper[check] = self.ownDistances(check)
+            computed += len(check)
+            check = check[self.upper[check] > bound[check]]
+        if len(check) > 0:
+            distances = np.sqrt(self.squaredDistances(centroids, check))
+            computed += len(check) * self.K
+            self.labels[check] = np.argmin(distances, axis=1)
+            self.upper[check] = distances[np.arange(len(check)), self.labels[check]]
+            if self.K > 1:
+                self.lower[check] = np.partition(distances, 1, axis=1)[:, 1]
+        #saved compared to a full assign, negative while the centroids move a lot and tightening the bounds costs more than it saves
+        self.skipped.append(len(self.labels) * self.K - computed)
+    def squaredDistancesBetween(self, centroids):
+        """
+        Squared euclidean distances between all centroids
+        """
+        norms = (centroids ** 2).sum(axis=1)
+        return np.maximum(norms[:, None] - 2 * centroids.dot(centroids.T) + norms[None, :], 0)
 
     def assign(self):
         """
         assign-phase of K-Means. Every vector finds its closest centroid and is put into the according cluster
         """
         #print("Assign")
-        self.clusters = [[] for _ in range(self.K)]
-        for vector in self.vectors:
-            mindist = None
-            argminIdx = None
-            i = 0
-            for centroid in self.centroids:
-                dist = np.linalg.norm(vector - centroid)
-                if mindist is None or dist < mindist:
-                    mindist = dist
-                    argminIdx = i
-                i+=1
-            self.clusters[argminIdx].append(vector)
+        if self.accelerated and self.upper is not None:
+            self.assignBounded()
+            return
+        if self.spherical:
+            #rows and centroids have unit length: one sparse x dense product gives all cosine similarities
+            similarities = self.matrix.dot(np.array(self.centroids).T)
+            self.labels = np.argmax(similarities, axis=1)
+            if not self.accelerated:
+                self.inertia.append((1 - similarities[np.arange(len(self.labels)), self.labels]).sum())
+            distances = 2 - 2 * similarities
+        else:
+            distances = self.squaredDistances(np.array(self.centroids))
+            self.labels = np.argmin(distances, axis=1)
+            if not self.accelerated:
+                self.inertia.append(distances[np.arange(len(self.labels)), self.labels].sum())
+        if self.accelerated:
+            self.setBounds(np.sqrt(np.maximum(distances, 0)))
+            self.skipped.append(0)
+    def buildClusters(self):
+        """
+        Sets self.clusters to the row indexes of every cluster according to self.labels
+        """
+        self.clusters = [np.flatnonzero(self.labels == i) for i in range(self.K)]
     def recompute(self):
         """
-        Recompute-phase of K-Means. Every Centroid is set to the average of all its vectors.
+        Recompute-phase of K-Means. Every Centroid is set to the average of all its vectors, an empty cluster gets the vector farthest from its centroid.
+        :return: Squared distance all centroids moved, without the jumps of reseeded clusters
         """
         #print("Recompute")
+        self.shifts = np.zeros(self.K)
+        moved = self.reseed()
+        counts = np.bincount(self.labels, minlength=self.K)
+        #sum over the clusters of n * |mean|^2 (euclidean) or n * |mean| (spherical)
+        meanNorms = 0.0
         for i in range(self.K):
-            if (len(self.clusters[i]) <= 1):
-                self.centroids[i] = self.randomCentroid()
+            if counts[i] == 0:
+                continue
+            old = self.centroids[i]
+            self.centroids[i] = np.asarray(self.matrix[self.labels == i].mean(axis=0)).ravel()
+            if self.spherical:
+                meanNorms += counts[i] * np.linalg.norm(self.centroids[i])
+                self.centroids[i] = self.unit(self.centroids[i])
             else:
-                self.centroids[i] = sum(self.clusters[i]) / len(self.clusters[i])
-    def prepare(self):
+                meanNorms += counts[i] * np.dot(self.centroids[i], self.centroids[i])
+            self.shifts[i] = np.linalg.norm(self.centroids[i] - old)
+        if self.accelerated:
+            #the bounds do not give the distances, the inertia (to the new centroids) follows from the means: sum |x|^2 - sum n |mean|^2, for unit vectors sum (1 - cos) = n - sum n |mean|
+            if self.spherical:
+                self.inertia.append(len(self.labels) - meanNorms)
+            else:
+                self.inertia.append(self.matrix.multiply(self.matrix).sum() - meanNorms)
+        if self.upper is not None:
+            self.upper += self.shifts[self.labels]
+            #a moved vector is the centroid of its new cluster
+            self.upper[moved] = 0
+            self.lower[moved] = 0
+        #the bounds need the jumps, the convergence test does not
+        return np.sum(np.delete(self.shifts, self.labels[moved]) ** 2)
+    def reseed(self):
         """
-        Prepare-phase of K-Means. Every vector is initialized randomly.
-        """
-        #compute maximum count of each word
-        #print("Preprocessing: MaxVector")
-        self.centroids = []
-        self.maxVector = np.zeros(self.dim)
-        for vector in self.vectors:
-            for i in range(self.dim):
-                self.maxVector[i] = max(self.maxVector[i], vector[i])
-        #random centroids
-        #print("Preprocessing: RandomCentroid")
-        for i in range(self.K):
-            self.centroids.append(self.randomCentroid())
-    def randomCentroid(self):
+        Moves the vectors farthest from their centroids into the empty clusters, only clusters with more than one vector give one away
+        :return: Row indexes of the moved vectors
+        """
+        counts = np.bincount(self.labels, minlength=self.K)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty) == 0:
+            return np.empty(0, dtype=np.intp)
+        distances = self.ownDistances()
+        moved = []
+        for i in empty:
+            distances[counts[self.labels] <= 1] = -1
+            row = np.argmax(distances)
+            if distances[row] < 0:
+                #less vectors than clusters
+                break
+            counts[self.labels[row]] -= 1
+            counts[i] += 1
+            self.labels[row] = i
+            distances[row] = -1
+            moved.append(row)
+        return np.array(moved, dtype=np.intp)
+    def prepare(self):
         """
-        This method requires self.maxVector to be set!
-        :return: A random centroid.
+        Prepare-phase of K-Means. The centroids are seeded with k-means++.
         """
-        centroid = []
-        for i in range(self.dim):
-            centroid.append(np.random.randint(self.maxVector[i] + 1))
-        return np.array(centroid)
+        #k-means++: every new centroid is a vector drawn proportional to its squared distance to the closest centroid so far
+        #print("Preprocessing: k-means++")
+        documents = self.matrix.shape[0]
+        self.centroids = [self.matrix[np.random.randint(documents)].toarray().ravel()]
+        closest = self.squaredDistances(self.centroids[0])[:, 0]
+        for i in range(1, self.K):
+            total = closest.sum()
+            if total == 0:
+                #less distinct vectors than clusters
+                self.centroids.append(self.matrix[np.random.randint(documents)].toarray().ravel())
+                continue
+            #rounding can leave the last cumulative sum below total, so the pick is clipped to the last row
+            pick = min(np.searchsorted(np.cumsum(closest), np.random.rand() * total), documents - 1)
+            self.centroids.append(self.matrix[pick].toarray().ravel())
+            closest = np.minimum(closest, self.squaredDistances(self.centroids[-1])[:, 0])
     def evaluate(self):
         """
-        This method computes some metrics. It's very slow currently.
+        This method computes the metrics of evaluation.py for the clusters and the pair counts of the class x cluster contingency table.
         :return: Rand Index Metric
         """
         #print("-----------Evaluation-------------")
-        pairs = []
-        for idx,item in enumerate(self.vectors):
-            for jidx, jitem in enumerate(self.vectors):
-                if idx > jidx:
-                    pairs.append((item, jitem))
-        FP = FN = TP = TN = 0
-        progressPoints = [i for i in range(1,len(pairs),len(pairs)//10)]
-        i = 0
-        #for idx, cluster in enumerate(self.clusters):
-        #    print("Length of cluster " + str(idx + 1) + ": " + str(len(cluster)))
-        #for idx, aClass in enumerate(self.solution):
-        #    print("Length of class " + self.classes[idx] + ": " + str(len(aClass)))
-        for pair in pairs:
-            #if i in progressPoints:
-                #print("Evaluation progress: " + str(i) + " of " + str(len(pairs)) + "...")
-            i+=1
-            firstClass = secondClass = firstCluster = secondCluster = None
-
-            for grpIdx, grp in enumerate(self.solution):
-                if self.numpyIn(pair[0],grp):
-                    firstClass = grpIdx
-                if self.numpyIn(pair[1],grp):
-                    secondClass = grpIdx
-            for clusterIdx, cluster in enumerate(self.clusters):
-                if self.numpyIn(pair[0],cluster):
-                    firstCluster = clusterIdx
-                if self.numpyIn(pair[1],cluster):
-                    secondCluster = clusterIdx
-            if firstClass == secondClass and firstCluster == secondCluster:
-                TP += 1
-            if firstClass != secondClass and firstCluster == secondCluster:
-                FP += 1
-            if firstClass == secondClass and firstCluster != secondCluster:
-                FN += 1
-            if firstClass != secondClass and firstCluster != secondCluster:
-                TN += 1
-        (self.TP, self.FP, self.FN, self.TN) = (TP, FP, FN, TN)
-        #print("TP: " + str(TP))
-        #print("FP: " + str(FP))
-        #print("FN: " + str(FN))
-        #print("TN: " + str(TN))
-        RandIndex = float(TP + TN)/(TP + TN + FP + FN)
+        (self.TP, self.FP, self.FN, self.TN) = evaluation.pair_counts(evaluation.contingency_table(self.classLabels, self.labels))
+        self.metrics = evaluation.evaluate(self.classLabels, self.labels)
+        #print("TP: " + str(self.TP))
+        #print("FP: " + str(self.FP))
+        #print("FN: " + str(self.FN))
+        #print("TN: " + str(self.TN))
+        RandIndex = self.metrics["rand_index"]
         assert(RandIndex <= 1)
         print("Rand Index: " + str(RandIndex))
         return RandIndex
-    def numpyIn(self, needle, haystack):
-        """
-        Helper Method: This can be used to find a numpy-array inside a collection of numpy-arrays.
-        """
-        for elem in haystack:
-            if np.array_equal(needle, elem):
-                return True
-        return False
     def findClosest(self):
         """
-        This finds the closest vector to each centroid (We assume that this vector can be found in the cluster of the centroid)
+        This finds the row index of the closest vector to each centroid within its cluster (-1 for an empty cluster)
         """
-        self.closest = []
+        centroids = np.array(self.centroids)
+        if self.spherical:
+            distances = 1 - self.matrix.dot(centroids.T)
+        else:
+            distances = self.squaredDistances(centroids)
+        own = distances[np.arange(len(self.labels)), self.labels]
+        self.closest = np.full(self.K, -1, dtype=np.intp)
         for idx, cluster in enumerate(self.clusters):
-            argmin = None
-            min = None
-            for vector in cluster:
-                dist = np.linalg.norm(vector - self.centroids[idx])
-                if min is None or dist < min:
-                    argmin = vector
-            self.closest.append(argmin)
+            if len(cluster) > 0:
+                self.closest[idx] = cluster[np.argmin(own[cluster])]
 
-    def main(self, iterations):
+    def main(self, K, max_iter = 100, tol = 1e-4):
         """
         Run full K-Means with initialization and evaluation
-        :param iterations: This is the "K"
+        :param K: Number of clusters
+        :param max_iter: Upper bound for the assign/recompute iterations
+        :param tol: Stop early once the centroids move less than this (relative to the mean variance of the vectors)
         :return: Rand Index
         """
-        print("######### Calculate with K = " + str(iterations))
+        print("######### Calculate with K = " + str(K))
+        self.run(K, max_iter, tol)
+        self.findClosest()
+        return self.evaluate()
+    def run(self, K, max_iter = 100, tol = 1e-4):
+        """
+        Run K-Means with initialization, but without evaluation
+        :param K: Number of clusters
+        :param max_iter: Upper bound for the assign/recompute iterations
+        :param tol: Stop early once the centroids move less than this (relative to the mean variance of the vectors)
+        :return: Cluster index of every (non-empty) review
+        self.iterations counts the iterations, self.inertia has one value per iteration (accelerated: to the centroids after the update, else before)
+        """
         self.read_data(filepath, self.data_length)
         self.initWords()
         self.determineClasses()
+        self.K = K
         self.initVectors()
+        self.buildSolution()
         self.prepare()
-        for i in range(iterations):
+        self.inertia = []
+        self.iterations = 0
+        self.skipped = []
+        self.upper = self.lower = None
+        #mean variance of the columns, computed on the sparse matrix
+        meanSquare = np.asarray(self.matrix.multiply(self.matrix).mean(axis=0)).ravel()
+        mean = np.asarray(self.matrix.mean(axis=0)).ravel()
+        threshold = tol * np.mean(meanSquare - mean ** 2)
+        for i in range(max_iter):
             #print("Iteration: " + str(i+1))
+            self.iterations += 1
             self.assign()
-            self.recompute()
-        self.findClosest()
-        return self.evaluate()
+            if self.recompute() <= threshold:
+                break
+        self.buildClusters()
+        #print("Iterations: " + str(self.iterations) + ", inertia: " + str(self.inertia[-1]))
+        return self.labels
 
 def main():
     two_ratings = []
@@ -245,9 +410,19 @@ def main():
         second_means = KMeans(100)
         twenty_ratings.append(second_means.main(20))
         for idx in range(second_means.K):
-            print("Closest Document in Cluster " + str(idx) + ":\n" + '\t'.join(second_means.findReview(second_means.closest[idx])))
+            review = second_means.findReview(second_means.closest[idx])
+            if review is None:
+                print("Cluster " + str(idx) + " is empty")
+                continue
+            print("Closest Document in Cluster " + str(idx) + ":\n" + '\t'.join(review))
     print("Average Rand Index for K = 2: " + str(np.average(two_ratings)))
     print("Average Rand Index for K = 20: " + str(np.average(twenty_ratings)))
+    #spherical K-Means is fast enough for the whole file
+    spherical = KMeans(spherical = True)
+    labels = spherical.run(20)
+    print("Spherical K-Means on " + str(len(labels)) + " reviews, cluster sizes: " + str(np.bincount(labels, minlength = 20)))
+    spherical.evaluate()
+    print("Adjusted Rand Index: " + str(spherical.metrics["adjusted_rand_index"]) + ", NMI: " + str(spherical.metrics["nmi"]) + ", purity: " + str(spherical.metrics["purity"]))
     
 if __name__ == "__main__":
     main()
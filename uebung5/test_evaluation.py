@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import evaluation
+
+classes = np.array(["a", "a", "a", "b", "b", "c"])
+clusters = np.array([0, 0, 1, 1, 1, 2])
+
+
+def test_contingency_table():
+    table = evaluation.contingency_table(classes, clusters)
+    np.testing.assert_array_equal(table, [[2, 1, 0], [0, 2, 0], [0, 0, 1]])
+
+
+def test_pair_counts():
+    table = evaluation.contingency_table(classes, clusters)
+    # same cluster: 1 + 3 pairs, same class: 3 + 1 pairs, both: (0, 1) and
+    # (3, 4), 15 pairs in total
+    assert evaluation.pair_counts(table) == (2, 2, 2, 9)
+    assert evaluation.rand_index(table) == pytest.approx(11 / 15)
+
+
+def test_purity():
+    table = evaluation.contingency_table(classes, clusters)
+    assert evaluation.purity(table) == pytest.approx(5 / 6)
+
+
+def test_identical_clusterings():
+    # the metrics do not depend on the names of the clusters
+    metrics = evaluation.evaluate(classes, np.array([7, 7, 7, 3, 3, 5]))
+    for name in ("rand_index", "adjusted_rand_index", "nmi", "purity"):
+        assert metrics[name] == pytest.approx(1.0)
+
+
+def test_adjusted_rand_index():
+    table = evaluation.contingency_table(classes, clusters)
+    # index 2, expected 4 * 4 / 15, maximum 4
+    assert evaluation.adjusted_rand_index(table) == \
+        pytest.approx((2 - 16 / 15) / (4 - 16 / 15))
+    # one cluster for everything is not better than chance
+    single = evaluation.contingency_table(classes, np.zeros(6))
+    assert evaluation.adjusted_rand_index(single) == pytest.approx(0.0)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import feature_matrix
+
+
+def test_save_and_load(tmp_path):
+    filename = str(tmp_path / "features.npy")
+    table = np.arange(12, dtype=np.float64).reshape(4, 3)
+    feature_matrix.save(filename, table, ("a", "b", "c"))
+    loaded, columns = feature_matrix.load(filename)
+    assert columns == ("a", "b", "c")
+    np.testing.assert_array_equal(loaded, table)
+
+
+def test_load_plain_array(tmp_path):
+    filename = str(tmp_path / "plain.npy")
+    table = np.arange(10, dtype=np.float64).reshape(5, 2)
+    np.save(filename, table)
+    loaded, columns = feature_matrix.load(filename)
+    assert columns == ("V1", "V2")
+    assert loaded.dtype == np.float64
+    np.testing.assert_array_equal(loaded, table)
+    assert feature_matrix.column_indexes(columns, ["V2"]) == [1]
+
+
+def test_load_plain_array_other_dtype(tmp_path):
+    filename = str(tmp_path / "plain.npy")
+    np.save(filename, np.ones((3, 2), dtype=np.float32))
+    loaded, columns = feature_matrix.load(filename)
+    assert loaded.dtype == np.float64
+    np.testing.assert_array_equal(loaded, np.ones((3, 2)))
+
+
+def test_load_rejects_one_dimensional(tmp_path):
+    filename = str(tmp_path / "vector.npy")
+    np.save(filename, np.ones(3))
+    with pytest.raises(ValueError):
+        feature_matrix.load(filename)
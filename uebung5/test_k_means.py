@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import k_means
+
+
+def blobs(n=3000, k=8, d=2, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(-10, 10, size=(k, d))
+    return (centers[rng.randint(k, size=n)] +
+            rng.normal(size=(n, d))).astype(np.float64)
+
+
+@pytest.mark.parametrize("d", [2, 16])
+@pytest.mark.parametrize("algorithm", ["hamerly", "elkan"])
+def test_same_labels_as_lloyd(algorithm, d):
+    X = blobs(d=d)
+    C = k_means.k_means_plus_plus(X, 10, np.random.RandomState(1))
+    labels, centroids, inertia, history, _ = k_means.lloyd(X, C)
+    result = k_means.algorithms[algorithm](X, C)
+    np.testing.assert_array_equal(result[0], labels)
+    np.testing.assert_allclose(result[1], centroids, rtol=1e-5, atol=1e-5)
+    assert result[2] == pytest.approx(inertia, rel=1e-4)
+    assert len(result[3]) == len(history)
+    assert sum(result[4]) > 0
+
+
+def test_k_means_plus_plus():
+    X = blobs()
+    C = k_means.k_means_plus_plus(X, 10, np.random.RandomState(0))
+    assert C.shape == (10, 2)
+    # every centroid is one of the points
+    assert (C[:, None] == X[None]).all(axis=2).any(axis=1).all()
+    # less distinct points than clusters
+    C = k_means.k_means_plus_plus(np.zeros((5, 2)), 3,
+                                  np.random.RandomState(0))
+    np.testing.assert_array_equal(C, 0)
+
+
+def test_choose_algorithm():
+    assert k_means.choose_algorithm("auto") is k_means.hamerly
+    assert k_means.choose_algorithm("elkan") is k_means.elkan